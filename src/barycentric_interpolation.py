@@ -0,0 +1,140 @@
+import numpy as np
+from utils.lazy_import import lazy_import
+import utils.matrix_operations as mat
+import utils.plotting as plt
+
+sp = lazy_import('sympy') # Only loaded for the symbolic/LaTeX output
+
+class BarycentricInterpolation:
+    def __init__(self, x_points, y_points, nodes=None, weights=None):
+        """
+        Initialize Barycentric Lagrange Interpolation with data points, and calculate the barycentric weights
+        w_j = 1 / prod(x_j - x_k) once. The result is the same polynomial as NewtonInterpolation.
+
+        Args:
+            x_points (list/array): x coordinates
+            y_points (list/array): y coordinates, or a 2D array of shape (n_points, n_series) for several series
+            nodes (str, optional): 'chebyshev1' or 'chebyshev2' if x_points are Chebyshev points of the first or
+                second kind (in either order, on any interval) to use the closed form weights in O(n). Defaults to None.
+            weights (list/array, optional): already calculated barycentric weights, e.g. of a saved model. Defaults to None.
+        """
+        self.x_values = np.asarray(x_points, dtype=np.float64)
+        self.y_values = None
+        if weights is None:
+            self.weights = self.calculate_weights(self.x_values, nodes)
+        else:
+            self.weights = np.asarray(weights, dtype=np.float64)
+
+        self.polynomial = None
+        self.set_y_values(y_points)
+
+    @staticmethod
+    def calculate_weights(x_values, nodes=None):
+        """
+        Calculate the barycentric weights of the given nodes, scaled to avoid overflow (the scale cancels out).
+        Args:
+            x_values (ndarray): interpolation nodes
+            nodes (str, optional): 'chebyshev1', 'chebyshev2' or None for any nodes. Defaults to None.
+        Returns:
+            ndarray: barycentric weights
+        """
+        n = len(x_values)
+        j = np.arange(n)
+        if nodes == 'chebyshev1':
+            # x_j = cos((2j+1)pi / 2n)
+            return (-1.0) ** j * np.sin((2 * j + 1) * np.pi / (2 * n))
+        if nodes == 'chebyshev2':
+            # x_j = cos(j pi / (n-1)), halved weights at both ends
+            weights = (-1.0) ** j
+            weights[[0, -1]] *= 0.5
+            return weights
+        if nodes is not None:
+            raise ValueError(f"Unknown nodes kind '{nodes}'")
+
+        # O(n^2): w_j = 1 / prod_{k != j} (x_j - x_k), scaled by the interval length to keep the products bounded
+        diff = (x_values[:, None] - x_values[None, :]) * (4 / (x_values.max() - x_values.min()) if n > 1 else 1)
+        np.fill_diagonal(diff, 1)
+        weights = 1 / np.prod(diff, axis=1)
+        return weights / np.abs(weights).max()
+
+    def set_y_values(self, y_points):
+        """
+        Replace the y values on the same x nodes, the weights are reused as they only depend on x.
+        Args:
+            y_points (list/array): y coordinates, or a 2D array of shape (n_points, n_series)
+        """
+        if len(y_points) != len(self.x_values):
+            raise ValueError("y_points must have the same length as x_points")
+        self.y_values = np.asarray(y_points, dtype=np.float64)
+        self.polynomial = None
+
+    def evaluate_for_x(self, value, block_elements=1 << 20):
+        """
+        Evaluate the interpolation polynomial at a given point x or an array of points
+        with the barycentric formula p(x) = sum(w_j y_j / (x - x_j)) / sum(w_j / (x - x_j)).
+        Args:
+            value (float/array): query point(s)
+            block_elements (int, optional): size of the (queries, nodes) temporaries evaluated at a time to bound memory,
+                the block holds block_elements // n_nodes query points. Defaults to 2^20, about 8 MiB per temporary.
+        Returns:
+            float/ndarray: interpolated value(s) with the same shape as value, followed by the series axis for several series
+        """
+        values = np.asarray(value, dtype=np.float64)
+        flat = values.reshape(-1)
+        result = np.empty(flat.shape + self.y_values.shape[1:])
+
+        block_size = max(1, block_elements // len(self.x_values))
+        for start in range(0, len(flat), block_size):
+            block = flat[start:start + block_size]
+            diff = block[:, None] - self.x_values[None, :]
+            exact = diff == 0
+            diff[exact] = 1 # Avoid division by zero, exact nodes are replaced below
+            terms = self.weights / diff
+            block_result = (terms @ self.y_values) / mat.as_column(terms.sum(axis=1), self.y_values.ndim)
+
+            # Query points equal to a node take its y value
+            rows, cols = np.nonzero(exact)
+            block_result[rows] = self.y_values[cols]
+            result[start:start + block_size] = block_result
+
+        result = result.reshape(values.shape + self.y_values.shape[1:])
+        return result[()] if result.ndim == 0 else result
+
+    def interpolate(self):
+        """Calculate the expanded symbolic polynomial, only needed for the symbolic/LaTeX output."""
+        if self.y_values.ndim > 1:
+            raise ValueError("The symbolic form is only available for a single series")
+        x = sp.symbols('x')
+        nodes = [float(node) for node in self.x_values]
+        poly = 0
+        for j, (x_j, y_j) in enumerate(zip(nodes, self.y_values)):
+            # Lagrange basis l_j(x) = prod (x - x_k) / (x_j - x_k)
+            basis = 1
+            for k, x_k in enumerate(nodes):
+                if k != j:
+                    basis *= (x - x_k) / (x_j - x_k)
+            poly += float(y_j) * basis
+        self.polynomial = sp.expand(poly)
+
+    def plot(self, num_points=100, path=None):
+        """
+        Plot the interpolation polynomial and data points.
+        Args:
+            path (str, optional): save the figures to this image file instead of showing them
+        Returns:
+            list: paths of the saved images
+        """
+        # Ensure we have the polynomial
+        if self.polynomial is None:
+            self.interpolate()
+
+        _, axes = plt.create_fig(2) # Figure window to contain graph and polynomial
+
+        # Plot a graph on the first subplot
+        plt.plot_graph(axes[0], self.x_values, self.y_values, self.polynomial, ' Barycentric Interpolation')
+
+        # Write the polynomial on the second subplot
+        plt.write_text(axes[1], "Expanded Form:\n$P(x)=" + sp.latex(self.polynomial) + "$")
+
+        # Show the entire figure with all subplots
+        return plt.show(path)
@@ -0,0 +1,170 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import os
+import numpy as np
+from newton_interpolation import NewtonInterpolation
+from cubic_splines import CubicSplineInterpolation
+from barycentric_interpolation import BarycentricInterpolation
+from least_squares import LeastSquares
+
+METHODS = ('newton', 'spline', 'barycentric', 'least_squares')
+_MODEL_PARAMETERS = {'periodic': 3, 'powerlaw': 2, 'exponential': 2, 'drug_concentration': 2}
+
+def _parameter_count(method, n_points, options):
+    """
+    Number of float64 values stored for a fitted dataset of n_points points.
+    """
+    if method == 'least_squares':
+        model = options.get('model', 'polynomial')
+        return options.get('degree', 1) + 1 if model == 'polynomial' else _MODEL_PARAMETERS[model]
+    return n_points
+
+def _fit_parameters(method, x_values, y_values, options):
+    """
+    Fit one dataset and return the array that defines the fitted model.
+    """
+    if method == 'newton':
+        parameters = NewtonInterpolation(x_values, y_values).coefficients
+    elif method == 'spline':
+        parameters = CubicSplineInterpolation(x_values, y_values, options.get('w0', 0), options.get('wn', 0),
+                                              boundary=options.get('boundary', 'natural'),
+                                              d0=options.get('d0', 0), dn=options.get('dn', 0)).w_values
+    elif method == 'barycentric':
+        parameters = BarycentricInterpolation(x_values, y_values, options.get('nodes')).weights
+    else:
+        model = LeastSquares(x_values, y_values, options.get('solver', 'normal'))
+        if options.get('model', 'polynomial') == 'polynomial':
+            model.polynomial_interpolation(options.get('degree', 1))
+        else:
+            getattr(model, options['model'] + '_interpolation')()
+        parameters = model.c_vector.ravel()
+
+    if not np.all(np.isfinite(parameters)):
+        raise FloatingPointError("The fit produced non-finite values (duplicate x values or singular system)")
+    return parameters
+
+def _build_model(method, x_values, y_values, parameters, options):
+    """
+    Create the fitted model of a dataset from its stored parameters, without refitting.
+    """
+    if method == 'newton':
+        return NewtonInterpolation(x_values, y_values, coefficients=parameters)
+    if method == 'spline':
+        return CubicSplineInterpolation(x_values, y_values, w_values=parameters, boundary=options.get('boundary', 'natural'))
+    if method == 'barycentric':
+        return BarycentricInterpolation(x_values, y_values, weights=parameters)
+    return LeastSquares.from_coefficients(options.get('model', 'polynomial'), parameters, options.get('degree', 1))
+
+def fit_model(method, x_values, y_values, options=None):
+    """
+    Fit one dataset in the current process, e.g. from an executor.
+    Args:
+        method (str): 'newton', 'spline', 'barycentric' or 'least_squares'
+        x_values (ndarray): x values
+        y_values (ndarray): y values
+        options (dict, optional): method options, as for fit_many. Defaults to None.
+    Returns:
+        The fitted model.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}', expected one of {METHODS}")
+    options = dict() if options is None else options
+    x_values = np.asarray(x_values, dtype=np.float64)
+    y_values = np.asarray(y_values, dtype=np.float64)
+    with np.errstate(divide='raise', invalid='raise', over='raise'):
+        parameters = _fit_parameters(method, x_values, y_values, options)
+    return _build_model(method, x_values, y_values, parameters, options)
+
+def _fit_chunk(input_name, output_name, total_points, total_parameters, chunk, method, options):
+    """
+    Worker: fit the datasets of a chunk, reading the points from and writing the parameters to shared memory.
+    Args:
+        chunk (list): (index, point offset, n_points, parameter offset, n_parameters) of each dataset
+    Returns:
+        list: (index, None) for each fitted dataset, (index, exception) for each failed one
+    """
+    input_memory = shared_memory.SharedMemory(name=input_name)
+    output_memory = shared_memory.SharedMemory(name=output_name)
+    try:
+        points = np.ndarray((2, total_points), dtype=np.float64, buffer=input_memory.buf)
+        parameters = np.ndarray((total_parameters,), dtype=np.float64, buffer=output_memory.buf)
+        results = list()
+        for index, offset, n_points, parameter_offset, n_parameters in chunk:
+            try:
+                x_values = points[0, offset:offset + n_points]
+                y_values = points[1, offset:offset + n_points]
+                # Raise instead of warning on division by zero so the dataset is reported as failed
+                with np.errstate(divide='raise', invalid='raise', over='raise'):
+                    parameters[parameter_offset:parameter_offset + n_parameters] = _fit_parameters(method, x_values, y_values, options)
+                results.append((index, None))
+            except Exception as error: # One failing dataset must not abort the others
+                results.append((index, error))
+        del points, parameters # Release the buffer views before closing
+        return results
+    finally:
+        input_memory.close()
+        output_memory.close()
+
+def fit_many(datasets, method='spline', options=None, max_workers=None, chunk_size=None):
+    """
+    Fit many independent datasets in parallel over a process pool. The points are passed to the workers and the fitted
+    parameters back through shared memory, and the datasets are sent in chunks to amortize the per task overhead.
+    Args:
+        datasets (sequence): (x values, y values) pair of each dataset
+        method (str, optional): 'newton', 'spline', 'barycentric' or 'least_squares'. Defaults to 'spline'.
+        options (dict, optional): method options: boundary, w0, wn, d0 and dn for spline, nodes for barycentric,
+            model, degree and solver for least_squares. Defaults to None.
+        max_workers (int, optional): number of processes. Defaults to the number of CPUs.
+        chunk_size (int, optional): number of datasets per task. Defaults to about 4 tasks per process.
+    Yields:
+        tuple: (dataset index, fitted model) as soon as its chunk is done, or (dataset index, exception) if it failed
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}', expected one of {METHODS}")
+    options = dict() if options is None else options
+    if len(datasets) == 0:
+        return
+    max_workers = max_workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, -(-len(datasets) // (max_workers * 4)))
+
+    # Layout of every dataset in the shared input and output buffers
+    layout = list()
+    total_points = 0
+    total_parameters = 0
+    for index, (x_values, y_values) in enumerate(datasets):
+        n_points = len(x_values)
+        if len(y_values) != n_points:
+            raise ValueError(f"Dataset {index} has {n_points} x values and {len(y_values)} y values")
+        n_parameters = _parameter_count(method, n_points, options)
+        layout.append((index, total_points, n_points, total_parameters, n_parameters))
+        total_points += n_points
+        total_parameters += n_parameters
+
+    input_memory = shared_memory.SharedMemory(create=True, size=max(1, 16 * total_points))
+    output_memory = shared_memory.SharedMemory(create=True, size=max(1, 8 * total_parameters))
+    try:
+        points = np.ndarray((2, total_points), dtype=np.float64, buffer=input_memory.buf)
+        parameters = np.ndarray((total_parameters,), dtype=np.float64, buffer=output_memory.buf)
+        for (index, offset, n_points, _, _), (x_values, y_values) in zip(layout, datasets):
+            points[0, offset:offset + n_points] = x_values
+            points[1, offset:offset + n_points] = y_values
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_fit_chunk, input_memory.name, output_memory.name, total_points, total_parameters,
+                                       layout[start:start + chunk_size], method, options)
+                       for start in range(0, len(layout), chunk_size)]
+            for future in as_completed(futures):
+                for index, error in future.result():
+                    if error is not None:
+                        yield index, error
+                        continue
+                    _, offset, n_points, parameter_offset, n_parameters = layout[index]
+                    yield index, _build_model(method, points[0, offset:offset + n_points].copy(),
+                                              points[1, offset:offset + n_points].copy(),
+                                              parameters[parameter_offset:parameter_offset + n_parameters].copy(), options)
+        del points, parameters # Release the buffer views before closing
+    finally:
+        input_memory.close()
+        input_memory.unlink()
+        output_memory.close()
+        output_memory.unlink()
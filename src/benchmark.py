@@ -0,0 +1,177 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+import numpy as np
+from utils.divided_differences import calculate_divided_differences
+from newton_interpolation import NewtonInterpolation
+from cubic_splines import CubicSplineInterpolation
+from least_squares import LeastSquares, MODELS
+
+DEFAULT_SIZES = (10, 100, 1_000, 10_000, 100_000, 1_000_000)
+EVALUATION_NODES = 20 # Number of interpolation points of the models measured on growing query counts
+
+def _points(n):
+    """
+    Sorted, distinct and positive x values with smooth y values, usable by every method and model.
+    """
+    x_values = np.linspace(1, 2, n)
+    return x_values, np.exp(np.sin(3 * x_values))
+
+def _least_squares_case(model):
+    def setup(n):
+        x_values, y_values = _points(n)
+        fit = LeastSquares(x_values, y_values)
+        if model == 'polynomial':
+            return lambda: fit.polynomial_interpolation(3)
+        return getattr(fit, model + '_interpolation')
+    return setup
+
+def _spline_evaluation(n):
+    spline = CubicSplineInterpolation(*_points(EVALUATION_NODES))
+    queries = np.random.default_rng(0).uniform(1, 2, n)
+    return lambda: spline.evaluate_for_x(queries)
+
+def _newton_evaluation(n):
+    newton = NewtonInterpolation(*_points(EVALUATION_NODES))
+    queries = np.random.default_rng(0).uniform(1, 2, n)
+    return lambda: newton.evaluate_for_x(queries)
+
+def _generate_splines(n):
+    spline = CubicSplineInterpolation(*_points(n))
+    return spline.generate_splines
+
+def _newton_interpolate(n):
+    newton = NewtonInterpolation(*_points(n))
+    return newton.interpolate
+
+# name: (setup returning the function to measure for n points or queries, largest n measured)
+CASES = {
+    'divided_differences.full': (lambda n: lambda: calculate_divided_differences(*_points(n)), 2_000),
+    'divided_differences.diagonal': (lambda n: lambda: calculate_divided_differences(*_points(n), diagonal_only=True), 10_000),
+    'newton.construct': (lambda n: lambda: NewtonInterpolation(*_points(n)), 10_000),
+    'newton.interpolate': (_newton_interpolate, 100),
+    'newton.evaluate': (_newton_evaluation, 1_000_000),
+    'spline.construct': (lambda n: lambda: CubicSplineInterpolation(*_points(n)), 1_000_000),
+    'spline.generate_splines': (_generate_splines, 100),
+    'spline.evaluate': (_spline_evaluation, 1_000_000),
+}
+CASES.update({f'least_squares.{model}': (_least_squares_case(model), 1_000_000) for model in MODELS})
+
+def measure(function, repeat):
+    """
+    Measure the best wall time over repeat runs, and the peak memory allocated during one run.
+    Returns:
+        tuple: (seconds, peak bytes)
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def complexity_exponent(sizes, seconds):
+    """
+    Empirical exponent k of time ~ n^k, fitted in log-log scale over the sizes long enough to be measured reliably.
+    Returns:
+        float: the exponent, or None if there are less than two reliable sizes
+    """
+    points = [(n, t) for n, t in zip(sizes, seconds) if t > 1e-4]
+    if len(points) < 2:
+        return None
+    slope, _ = np.polyfit(np.log([n for n, _ in points]), np.log([t for _, t in points]), 1)
+    return float(slope)
+
+def import_time():
+    """
+    Time to import every interpolation module in a fresh interpreter, which must not load sympy or matplotlib.
+    Returns:
+        dict: seconds and whether sympy or matplotlib were actually executed by the import
+    """
+    code = ("import sys, time; start = time.perf_counter(); "
+            "import newton_interpolation, cubic_splines, least_squares, barycentric_interpolation; "
+            "print(time.perf_counter() - start, 'sympy.core' in sys.modules, 'matplotlib' in sys.modules)")
+    output = subprocess.run([sys.executable, '-c', code], cwd=Path(__file__).parent, capture_output=True, text=True, check=True)
+    seconds, sympy_loaded, matplotlib_loaded = output.stdout.split()
+    return {'seconds': float(seconds), 'sympy_loaded': sympy_loaded == 'True', 'matplotlib_loaded': matplotlib_loaded == 'True'}
+
+def run(sizes, repeat=3, cases=None):
+    """
+    Run the benchmark cases over the growing sizes.
+    Returns:
+        dict: results, with per case sizes, seconds, peak memory and complexity exponent
+    """
+    results = {'import': import_time(), 'cases': dict()}
+    for name, (setup, max_size) in CASES.items():
+        if cases and not any(name.startswith(case) for case in cases):
+            continue
+        case_sizes = [n for n in sizes if n <= max_size]
+        seconds = list()
+        peaks = list()
+        for n in case_sizes:
+            best, peak = measure(setup(n), repeat)
+            seconds.append(best)
+            peaks.append(peak)
+            print(f"{name:32} n={n:<9} {best * 1e3:12.3f} ms {peak / 2**20:10.2f} MiB", file=sys.stderr)
+        results['cases'][name] = {'sizes': case_sizes, 'seconds': seconds, 'peak_bytes': peaks,
+                                  'exponent': complexity_exponent(case_sizes, seconds)}
+    return results
+
+def compare(results, baseline, threshold):
+    """
+    Compare results against a baseline run.
+    Args:
+        threshold (float): allowed relative slowdown, e.g. 0.25 for 25%
+    Returns:
+        list: description of every regression, on times long enough to be measured reliably
+    """
+    regressions = list()
+    for name, case in results['cases'].items():
+        reference = baseline['cases'].get(name)
+        if reference is None:
+            continue
+        reference_seconds = dict(zip(reference['sizes'], reference['seconds']))
+        for n, seconds in zip(case['sizes'], case['seconds']):
+            before = reference_seconds.get(n)
+            if before is not None and before > 1e-4 and seconds > before * (1 + threshold):
+                regressions.append(f"{name} n={n}: {before * 1e3:.3f} ms -> {seconds * 1e3:.3f} ms")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark construction, evaluation and scaling of every method.")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help="comma separated point counts")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measurement, the best time is kept (default 3)")
+    parser.add_argument('--cases', nargs='*', help="only run the cases starting with these names, e.g. spline newton.evaluate")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', help="JSON results of a previous run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed relative slowdown against the baseline (default 0.25)")
+    args = parser.parse_args(argv)
+
+    results = run([int(n) for n in args.sizes.split(',')], args.repeat, args.cases)
+    for name, case in results['cases'].items():
+        exponent = case['exponent']
+        print(f"{name:32} O(n^{exponent:.2f})" if exponent is not None else f"{name:32} too fast to estimate", file=sys.stderr)
+    print(f"import time: {results['import']['seconds'] * 1e3:.1f} ms", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print("Regression: " + regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
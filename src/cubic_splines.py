@@ -1,11 +1,17 @@
 import numpy as np
-import sympy as sp
+from utils.lazy_import import lazy_import
 from utils.divided_differences import calculate_divided_differences, beautify_difftable
+import utils.matrix_operations as mat
 import utils.plotting as plt
+import utils.instrumentation as instr
+
+sp = lazy_import('sympy') # Only loaded for the symbolic/LaTeX output
+
+BOUNDARY_CONDITIONS = ('natural', 'clamped', 'not-a-knot', 'periodic')
 
 class CubicSplineInterpolation:
 
-    def __init__(self, x_points, y_points,w0 = 0,wn = 0):
+    def __init__(self, x_points, y_points,w0 = 0,wn = 0, w_values=None, boundary='natural', d0=0, dn=0):
         """
         Initialize Cubic Spline Interpolation with data points
         and calculate divided differences with 3 iterations
@@ -13,124 +19,401 @@ class CubicSplineInterpolation:
         
         Args:
             x_points (list/array): x coordinates
-            y_points (list/array): y coordinates
-            w0 (float, optional): weight at the start. Defaults to 0.
-            wn (float, optional): weight at the end. Defaults to 0.
+            y_points (list/array): y coordinates, or a 2D array of shape (n_points, n_series) to fit
+                several series sharing the same x values with a single tridiagonal factorization
+            w0 (float, optional): weight at the start, for the natural boundary. Defaults to 0.
+            wn (float, optional): weight at the end, for the natural boundary. Defaults to 0.
+            w_values (list/array, optional): already solved weights w_0 ... w_n, e.g. of a saved model.
+                The system is then not built until it is displayed. Defaults to None.
+            boundary (str, optional): boundary condition, one of BOUNDARY_CONDITIONS. Defaults to 'natural'.
+                'natural': given weights w0 and wn at the ends.
+                'clamped': given first derivatives d0 and dn at the ends.
+                'not-a-knot': continuous third derivative at x_1 and x_n-1, needs at least 4 points.
+                'periodic': S, S' and S'' equal at both ends, needs y_0 = y_n.
+            d0 (float, optional): first derivative at the start, for the clamped boundary. Defaults to 0.
+            dn (float, optional): first derivative at the end, for the clamped boundary. Defaults to 0.
         """
+        if boundary not in BOUNDARY_CONDITIONS:
+            raise ValueError(f"Unknown boundary condition '{boundary}', expected one of {BOUNDARY_CONDITIONS}")
 
-        # Store the divded differences with row0 and row1 as x and y values
-        self.difftable = calculate_divided_differences(x_points,y_points,3) 
+        # Knots and values as float64 arrays for the numeric evaluator
+        self.x_values = np.asarray(x_points, dtype=np.float64)
+        self.y_values = np.asarray(y_points, dtype=np.float64)
+        self.boundary = boundary
+        self.w0, self.wn = w0, wn
+        self.d0, self.dn = d0, dn
 
         # Calculate hi values where hi = x_i+1 - xi
-        self.h_values = [x2 - x1 for x1, x2 in zip(x_points[:-1], x_points[1:])]
+        self.h_values = np.diff(self.x_values)
+        if np.any(self.h_values == 0):
+            raise ValueError("The knots must be distinct, a segment of zero length has no spline")
 
-        self.A_matrix = None
+        self.difftable = None
+        self.A_diagonals = None
+        self.A_corners = None # (A[n-1, 0], A[0, n-1]) of the cyclic periodic system
         self.b_vector = None
         self.w_values = None
         self.piecewise = None
+        self.cumulative_integrals = None # Integral from x_0 to each knot, calculated on first use
+
+        if w_values is not None:
+            self.w_values = np.asarray(w_values, dtype=np.float64)
+            # Recover the end conditions from the weights, so the displayed system matches them
+            self.w0, self.wn = self.w_values[0], self.w_values[-1]
+            h_first, h_last = self.h_values[0], self.h_values[-1]
+            self.d0 = (self.y_values[1] - self.y_values[0]) / h_first - h_first * (2 * self.w_values[0] + self.w_values[1]) / 6
+            self.dn = (self.y_values[-1] - self.y_values[-2]) / h_last + h_last * (self.w_values[-2] + 2 * self.w_values[-1]) / 6
+            return
+
+        if boundary == 'not-a-knot' and len(self.x_values) < 4:
+            raise ValueError("The not-a-knot boundary condition needs at least 4 points")
+        if boundary == 'periodic':
+            if len(self.x_values) < 3:
+                raise ValueError("The periodic boundary condition needs at least 3 points")
+            if not np.allclose(self.y_values[0], self.y_values[-1]):
+                raise ValueError("The periodic boundary condition needs y_0 = y_n")
 
-        self.create_A_matrix()
-        self.create_b_vector()
+        self.build_system()
 
         self.solve_for_omega()
-        self.w_values.insert(0,w0)
-        self.w_values.append(wn)
+
+    def build_system(self):
+        """
+        Calculate the divided differences with 3 iterations, then create A and b of the system of linear equations
+        """
+        # Store the divded differences with row0 and row1 as x and y values
+        with instr.stage('spline.difftable', len(self.x_values)):
+            self.difftable = calculate_divided_differences(self.x_values,self.y_values,3)
+
+        with instr.stage('spline.assembly', len(self.x_values)):
+            self.create_A_matrix()
+            self.create_b_vector()
     
     def create_A_matrix(self):
         """
-        Create the matrix A for the system of linear equations which has a diagonal form
+        Create the matrix A for the system of linear equations which has a tridiagonal form,
+        cyclic tridiagonal for the periodic boundary.
+        Only the three diagonals are stored in self.A_diagonals as (lower, diagonal, upper),
+        and the two corners of the periodic system in self.A_corners.
         """
-        n = len(self.h_values) - 1 # Length of matrix diagonal
-        matrix = sp.zeros(n) # Fill matrix with 0's initially
+        h = self.h_values
+        if self.boundary == 'clamped':
+            # Unknowns w_0 ... w_n, the first and last rows are the end derivative equations
+            diagonal = np.concatenate(([h[0] / 3], (h[:-1] + h[1:]) / 3, [h[-1] / 3]))
+            self.A_diagonals = (h / 6, diagonal, h / 6)
+            return
+        if self.boundary == 'periodic':
+            # Unknowns w_0 ... w_n-1 as w_n = w_0, the row of w_0 wraps around to w_n-1 through h_n-1
+            diagonal = (np.roll(h, 1) + h) / 3
+            self.A_diagonals = (h[:-1] / 6, diagonal, h[:-1] / 6)
+            self.A_corners = (h[-1] / 6, h[-1] / 6)
+            return
 
         # Fill the diagonal with hi+hi1/3
-        for i in range(n):
-            matrix[i, i] = (self.h_values[i] + self.h_values[i+1])/3
+        diagonal = (h[:-1] + h[1:]) / 3
 
         # Fill the upper and lower diagonal with hi+1/6
-        for i in range(n - 1):
-            matrix[i, i+1] = self.h_values[i+1]/6
-            matrix[i+1, i] = self.h_values[i+1]/6
+        lower = h[1:-1] / 6
+        upper = h[1:-1] / 6
+
+        if self.boundary == 'not-a-knot':
+            # Substitute w_0 = ((h_0+h_1)w_1 - h_0 w_2)/h_1 in the first row and
+            # w_n = ((h_n-2+h_n-1)w_n-1 - h_n-1 w_n-2)/h_n-2 in the last row, which keeps the system tridiagonal
+            diagonal[0] += h[0] * (h[0] + h[1]) / (6 * h[1])
+            upper[0] -= h[0]**2 / (6 * h[1])
+            diagonal[-1] += h[-1] * (h[-2] + h[-1]) / (6 * h[-2])
+            lower[-1] -= h[-1]**2 / (6 * h[-2])
 
-        self.A_matrix = matrix
+        self.A_diagonals = (lower, diagonal, upper)
 
     def create_b_vector(self):
         """
         Create the vector b for the system of linear equations
         """
-        n = len(self.h_values) - 1
-        vector = sp.zeros(n,1)
-        for i in range(n):
-            vector[i] = (self.h_values[i] + self.h_values[i+1])*self.difftable[3][i] # Third row of the diff table
-        self.b_vector = vector
+        h = self.h_values
+        slopes = self.difftable[2] # f[x_i, x_i+1]
+        if self.boundary == 'periodic':
+            # f[x_i, x_i+1] - f[x_i-1, x_i], wrapping around for i = 0
+            self.b_vector = slopes - np.roll(slopes, 1, axis=0)
+            return
+
+        # Third row of the diff table
+        b_vector = mat.as_column(h[:-1] + h[1:], self.y_values.ndim) * self.difftable[3]
+        if self.boundary == 'natural' and len(b_vector):
+            # Move the known end weights to the right hand side, with 2 points there are no unknowns left
+            b_vector[0] -= h[0] / 6 * self.w0
+            b_vector[-1] -= h[-1] / 6 * self.wn
+        elif self.boundary == 'clamped':
+            b_vector = np.concatenate((slopes[:1] - self.d0, b_vector, self.dn - slopes[-1:]))
+        self.b_vector = b_vector
     
     def solve_for_omega(self):
         """
-        Solve the system of linear equations to find omega values
+        Solve the tridiagonal system of linear equations to find omega values in O(n),
+        and complete them with the end weights given or implied by the boundary condition.
         """
-        np_A_matrix = np.array(self.A_matrix)
-        np_b_vector = np.array(self.b_vector)
+        lower, diagonal, upper = self.A_diagonals
+        with instr.stage('spline.solve', len(diagonal)):
+            if self.boundary == 'periodic':
+                w_values = mat.solve_cyclic_tridiagonal(lower, diagonal, upper, *self.A_corners, self.b_vector)
+            else:
+                w_values = mat.solve_tridiagonal(lower, diagonal, upper, self.b_vector)
 
-        # Solve for omega, where it will be saved as a 1d array instead of a vertical numpy vector
-        self.w_values = np.linalg.solve(np_A_matrix.astype(np.float64), np_b_vector.astype(np.float64)).flatten().tolist()
+        series_shape = self.y_values.shape[1:]
+        h = self.h_values
+        if self.boundary == 'natural':
+            w_values = np.concatenate((np.full((1,) + series_shape, self.w0), w_values, np.full((1,) + series_shape, self.wn)))
+        elif self.boundary == 'not-a-knot':
+            w_first = ((h[0] + h[1]) * w_values[0] - h[0] * w_values[1]) / h[1]
+            w_last = ((h[-2] + h[-1]) * w_values[-1] - h[-1] * w_values[-2]) / h[-2]
+            w_values = np.concatenate((w_first[None], w_values, w_last[None]))
+        elif self.boundary == 'periodic':
+            w_values = np.concatenate((w_values, w_values[:1]))
+        self.w_values = w_values
+
+    def dense_A_matrix(self):
+        """
+        Build the full A matrix from its diagonals as a sympy matrix, for display only.
+        """
+        lower, diagonal, upper = self.A_diagonals
+        n = len(diagonal)
+        A = sp.Matrix(n, n, lambda i, j: diagonal[i] if i == j else upper[i] if j == i + 1 else lower[j] if i == j + 1 else 0)
+        if self.A_corners is not None:
+            A[n-1, 0] += self.A_corners[0]
+            A[0, n-1] += self.A_corners[1]
+        return A
 
 
     def generate_splines(self):
         """
-        Generate the cubic splines
+        Generate the cubic splines as a sympy Piecewise.
+        Only needed for the symbolic/LaTeX output, evaluate_for_x works without it.
         """
+        if self.y_values.ndim > 1:
+            raise ValueError("The symbolic form is only available for a single series")
         splines = []
         n = len(self.h_values)
         x = sp.symbols('x')
         
-        for i in range(n):
-            # Format: 
-            # self.difftable[0][i] = xi
-            # self.difftable[1][i] = yi
-            # self.h_values[i] = hi+1
-
-            h_iplus1 = self.h_values[i]
-            w_i = self.w_values[i]
-            w_iplus1 = self.w_values[i+1]
-            x_i = self.difftable[0][i]
-            x_iplus1 = self.difftable[0][i + 1]
-            y_i = self.difftable[1][i]
-            y_iplus1 = self.difftable[1][i+1]
-
-            #print(f"i = {i}")
-            #print(f"h_iplus1 = {h_iplus1}")
-            #print(f"wi = {w_i}")
-            #print(f"wi+1 = {w_iplus1}")
-            #func = ((w_i / (6 * h_iplus1)) * ((x_iplus1 - x)**3)) + \
-            #((w_iplus1 / (6 * h_iplus1)) * ((x - x_i)**3)) + \
-            #(((y_i / h_iplus1) - (h_iplus1 * (w_i / 6))) * (x_iplus1 - x)) + \
-            #(((y_iplus1 / h_iplus1) + (h_iplus1 * (w_iplus1 / 6))) * (x - x_i))
-            func = ((x_iplus1-x)**3 * w_i + (x-x_i)**3 * w_iplus1)/(6*h_iplus1) + \
-            ((x_iplus1 - x)* y_i + (x-x_i)*y_iplus1)/h_iplus1 - \
-            (h_iplus1/6)*((x_iplus1 - x) * w_i + (x - x_i)*w_iplus1)
+        # Build, expand and join the segment polynomials, nearly all of the sympy cost
+        with instr.stage('spline.piecewise', n):
+            for i in range(n):
+                # Format: 
+                # self.difftable[0][i] = xi
+                # self.difftable[1][i] = yi
+                # self.h_values[i] = hi+1
+
+                h_iplus1 = float(self.h_values[i])
+                w_i = float(self.w_values[i])
+                w_iplus1 = float(self.w_values[i+1])
+                x_i = float(self.x_values[i])
+                x_iplus1 = float(self.x_values[i + 1])
+                y_i = float(self.y_values[i])
+                y_iplus1 = float(self.y_values[i + 1])
+
+                #print(f"i = {i}")
+                #print(f"h_iplus1 = {h_iplus1}")
+                #print(f"wi = {w_i}")
+                #print(f"wi+1 = {w_iplus1}")
+                #func = ((w_i / (6 * h_iplus1)) * ((x_iplus1 - x)**3)) + \
+                #((w_iplus1 / (6 * h_iplus1)) * ((x - x_i)**3)) + \
+                #(((y_i / h_iplus1) - (h_iplus1 * (w_i / 6))) * (x_iplus1 - x)) + \
+                #(((y_iplus1 / h_iplus1) + (h_iplus1 * (w_iplus1 / 6))) * (x - x_i))
+                func = ((x_iplus1-x)**3 * w_i + (x-x_i)**3 * w_iplus1)/(6*h_iplus1) + \
+                ((x_iplus1 - x)* y_i + (x-x_i)*y_iplus1)/h_iplus1 - \
+                (h_iplus1/6)*((x_iplus1 - x) * w_i + (x - x_i)*w_iplus1)
             
-            if i == n-1:
-                condition = (x >= x_i) & (x <= x_iplus1)
-            else:
-                condition = (x >= x_i) & (x < x_iplus1) 
+                if i == n-1:
+                    condition = (x >= x_i) & (x <= x_iplus1)
+                else:
+                    condition = (x >= x_i) & (x < x_iplus1) 
+
+                splines.append((func.expand(),condition))
+
+            # Convert saved (Polynomial, condition) pairs in splines array as a Piecewise object
+            self.piecewise = sp.Piecewise(*splines)
+
+    def locate(self, values):
+        """
+        Find the spline segment of each query point with a binary search over the knots.
+        Segment i covers [x_i, x_i+1), the last one also includes x_n.
+        Args:
+            values (ndarray): query points
+        Returns:
+            ndarray: segment index of each point, -1 for points outside [x_0, x_n]
+        """
+        idx = np.searchsorted(self.x_values, values, side='right') - 1
+        idx[values == self.x_values[-1]] = len(self.h_values) - 1
+        idx[(values < self.x_values[0]) | (values > self.x_values[-1]) | np.isnan(values)] = -1
+        return idx
+
+    def locate_sorted(self, values):
+        """
+        Same as locate for query points sorted in increasing order, with a merge style sweep: the knots inside the
+        query range are located in the queries instead of each query in the knots, in O(k log m) for k knots
+        in the range of m queries, and the segment indices are then repeated over the runs of queries.
+        Args:
+            values (ndarray): query points sorted in increasing order
+        Returns:
+            ndarray: segment index of each point, -1 for points outside [x_0, x_n]
+        """
+        if len(values) == 0:
+            return np.empty(0, dtype=np.intp)
+        first = np.searchsorted(self.x_values, values[0], side='right')  # First knot after the first query
+        last = np.searchsorted(self.x_values, values[-1], side='right')  # One after the last knot before the last query
+        starts = np.searchsorted(values, self.x_values[first:last], side='left')
+        runs = np.diff(np.concatenate(([0], starts, [len(values)])))
+        idx = np.repeat(np.arange(first - 1, last), runs)
+
+        # Same end rules as locate
+        end = len(self.x_values) - 1
+        if idx[-1] >= end:
+            tail = np.searchsorted(values, self.x_values[-1], side='left')
+            idx[tail:] = -1
+            idx[tail:np.searchsorted(values, self.x_values[-1], side='right')] = end - 1
+        return idx
+
+    def evaluate_segments(self, values, idx):
+        """
+        Evaluate the spline at the query points on their given segments in one vectorized pass.
+        Args:
+            values (ndarray): query points
+            idx (ndarray): segment index of each point as returned by locate, -1 gives nan
+        Returns:
+            ndarray: spline values, of shape (n_queries, n_series) for several series
+        """
+        ndim = self.y_values.ndim
+        inside = mat.as_column(idx >= 0, ndim)
+        i = np.where(idx >= 0, idx, 0)
 
-            splines.append((func.expand(),condition))
+        h = mat.as_column(self.h_values[i], ndim)
+        w_i = self.w_values[i]
+        w_iplus1 = self.w_values[i + 1]
+        dx_left = mat.as_column(values - self.x_values[i], ndim)        # x - xi
+        dx_right = mat.as_column(self.x_values[i + 1] - values, ndim)   # xi+1 - x
 
-        # Convert saved (Polynomial, condition) pairs in splines array as a Piecewise object
-        self.piecewise = sp.Piecewise(*splines)
+        result = (dx_right**3 * w_i + dx_left**3 * w_iplus1) / (6 * h) + \
+            (dx_right * self.y_values[i] + dx_left * self.y_values[i + 1]) / h - \
+            (h / 6) * (dx_right * w_i + dx_left * w_iplus1)
+        return np.where(inside, result, np.nan)
 
     def evaluate_for_x(self, value):
         """
-        Evaluate the cubic spline at a given point x
+        Evaluate the cubic spline at a given point x or an array of points.
+        Points outside [x_0, x_n] evaluate to nan, like the Piecewise form.
+        Args:
+            value (float/array): query point(s)
+        Returns:
+            float/ndarray: spline value(s) with the same shape as value, followed by the series axis for several series
         """
-        x = sp.symbols('x')
-        return self.piecewise.subs(x, value)
+        values = np.asarray(value, dtype=np.float64)
+        flat = values.reshape(-1)
+        with instr.stage('spline.locate', flat.size):
+            idx = self.locate(flat)
+        with instr.stage('spline.evaluate', flat.size):
+            result = self.evaluate_segments(flat, idx).reshape(values.shape + self.y_values.shape[1:])
+        return result[()] if result.ndim == 0 else result
+
+    def derivative(self, value, order=1):
+        """
+        Evaluate a derivative of the cubic spline at a given point x or an array of points,
+        in closed form from the weights of each segment. Points outside [x_0, x_n] evaluate to nan.
+        Args:
+            value (float/array): query point(s)
+            order (int, optional): derivative order, 0 gives the spline itself. Defaults to 1.
+        Returns:
+            float/ndarray: derivative value(s) with the same shape as value, followed by the series axis for several series
+        """
+        if order < 0:
+            raise ValueError("The derivative order must be positive")
+        values = np.asarray(value, dtype=np.float64)
+        flat = values.reshape(-1)
+        idx = self.locate(flat)
+        if order == 0:
+            result = self.evaluate_segments(flat, idx)
+        else:
+            with instr.stage('spline.derivative', flat.size):
+                ndim = self.y_values.ndim
+                i = np.where(idx >= 0, idx, 0)
+                h = mat.as_column(self.h_values[i], ndim)
+                w_i = self.w_values[i]
+                w_iplus1 = self.w_values[i + 1]
+                dx_left = mat.as_column(flat - self.x_values[i], ndim)        # x - xi
+                dx_right = mat.as_column(self.x_values[i + 1] - flat, ndim)   # xi+1 - x
+
+                if order == 1:
+                    result = (dx_left**2 * w_iplus1 - dx_right**2 * w_i) / (2 * h) + \
+                        (self.y_values[i + 1] - self.y_values[i]) / h - (h / 6) * (w_iplus1 - w_i)
+                elif order == 2:
+                    result = (dx_right * w_i + dx_left * w_iplus1) / h
+                elif order == 3:
+                    result = (w_iplus1 - w_i) / h
+                else:
+                    result = np.zeros_like(w_i * h)
+                result = np.where(mat.as_column(idx >= 0, ndim), np.broadcast_to(result, w_i.shape), np.nan)
 
-    def plot(self, num_points=100):
-        """Plot the interpolation polynomial and data points."""
-        # Ensure we have the polynomial
+        result = result.reshape(values.shape + self.y_values.shape[1:])
+        return result[()] if result.ndim == 0 else result
+
+    def integral_from_start(self, values):
+        """
+        Integral of the spline from x_0 to each query point, in closed form per segment.
+        Args:
+            values (ndarray): 1D query points
+        Returns:
+            ndarray: integral values, nan for points outside [x_0, x_n]
+        """
+        h_values = mat.as_column(self.h_values, self.y_values.ndim)
+        if self.cumulative_integrals is None:
+            # Full segment integral h(y_i + y_i+1)/2 - h^3(w_i + w_i+1)/24
+            segments = h_values * (self.y_values[:-1] + self.y_values[1:]) / 2 - \
+                h_values**3 * (self.w_values[:-1] + self.w_values[1:]) / 24
+            self.cumulative_integrals = np.concatenate((np.zeros((1,) + self.y_values.shape[1:]), np.cumsum(segments, axis=0)))
+
+        idx = self.locate(values)
+        ndim = self.y_values.ndim
+        i = np.where(idx >= 0, idx, 0)
+        h = h_values[i]
+        w_i = self.w_values[i]
+        w_iplus1 = self.w_values[i + 1]
+        dx_left = mat.as_column(values - self.x_values[i], ndim)        # x - xi
+        dx_right = mat.as_column(self.x_values[i + 1] - values, ndim)   # xi+1 - x
+
+        # Antiderivative of the segment, minus its value at x_i
+        partial = (dx_left**4 * w_iplus1 - dx_right**4 * w_i) / (24 * h) + \
+            (dx_left**2 * self.y_values[i + 1] - dx_right**2 * self.y_values[i]) / (2 * h) - \
+            (h / 12) * (dx_left**2 * w_iplus1 - dx_right**2 * w_i) - \
+            (h**3 * w_i / 24 - h * self.y_values[i] / 2)
+        return np.where(mat.as_column(idx >= 0, ndim), self.cumulative_integrals[i] + partial, np.nan)
+
+    def integrate(self, a, b):
+        """
+        Definite integral of the cubic spline from a to b, both within [x_0, x_n], otherwise nan.
+        Args:
+            a (float/array): lower bound(s)
+            b (float/array): upper bound(s), broadcast against a
+        Returns:
+            float/ndarray: integral(s) with the broadcast shape of a and b, followed by the series axis for several series
+        """
+        a, b = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+        with instr.stage('spline.integrate', a.size):
+            result = self.integral_from_start(b.reshape(-1)) - self.integral_from_start(a.reshape(-1))
+        result = result.reshape(a.shape + self.y_values.shape[1:])
+        return result[()] if result.ndim == 0 else result
+
+    def plot(self, num_points=100, path=None):
+        """
+        Plot the interpolation polynomial and data points.
+        Args:
+            path (str, optional): save the figures to this image file instead of showing them
+        Returns:
+            list: paths of the saved images
+        """
+        # Build the symbolic piecewise only when it is displayed
         if self.piecewise is None:
-            return
+            self.generate_splines()
+        if self.difftable is None:
+            self.build_system()
         
         _, ax1 = plt.create_fig(1)
         _, tableax = plt.create_fig(1)
@@ -156,10 +439,10 @@ class CubicSplineInterpolation:
             "Deduced Piecewise from table:\n" +
             "$P(x) = " + sp.latex(self.piecewise) + "$\n\n" +
             "Matrix:\n" +
-            "$A = " + sp.latex(self.A_matrix.applyfunc(lambda x: round(x, 4))) + "$\n" +
-            "Vectors b and w: $b = " + sp.latex(self.b_vector.applyfunc(lambda x: round(x, 4))) + 
+            "$A = " + sp.latex(self.dense_A_matrix().applyfunc(lambda x: round(x, 4))) + "$\n" +
+            "Vectors b and w: $b = " + sp.latex(sp.Matrix(self.b_vector).applyfunc(lambda x: round(x, 4))) + 
             ", \omega = " + sp.latex(sp.Matrix(self.w_values).applyfunc(lambda x: round(x, 4))) + "$"
         )
 
         # Show the entire figure with all subplots
-        plt.show()
+        return plt.show(path)
@@ -1,19 +1,59 @@
-import sympy as sp
 import numpy as np
-from math import cos, sin, pi, log
+from math import pi
+from utils.lazy_import import lazy_import
 import utils.plotting as plt
 import utils.matrix_operations as mat
+import utils.instrumentation as instr
+
+sp = lazy_import('sympy') # Only loaded for the symbolic/LaTeX output
+
+MODELS = ('polynomial', 'periodic', 'powerlaw', 'exponential', 'drug_concentration')
+
+def model_system(model, x_values, y_values, degree=1):
+    """
+    Build the design matrix A and the b vector of the linearized system Ac = b of a model.
+    Args:
+    model (str): one of MODELS
+    x_values (ndarray): x values
+    y_values (ndarray): y values, or a 2D array of shape (n_points, n_series)
+    degree (int): Optional, default value 1. The degree of the polynomial model
+    Returns:
+    A matrix and b column vector, with one column per series (ndarray, ndarray)
+    """
+    # The linearized models take logarithms, which NumPy turns into nan for values <= 0 instead of raising
+    logged = {'powerlaw': ('x', 'y'), 'exponential': ('y',), 'drug_concentration': ('x', 'y')}.get(model, ())
+    for name, values in (('x', x_values), ('y', y_values)):
+        if name in logged and not np.all(np.asarray(values) > 0):
+            raise ValueError(f"The {model} model needs positive {name} values")
+    if model == 'polynomial':
+        return mat.generate_vandermonde_matrix(x_values, degree), y_values.reshape(len(x_values), -1)
+    if model == 'periodic':
+        return mat.generate_periodic_matrix(x_values), y_values.reshape(len(x_values), -1)
+    if model == 'powerlaw':
+        return mat.generate_vandermonde_matrix(np.log(x_values), 1), mat.generate_log_colvector(y_values)
+    if model == 'exponential':
+        return mat.generate_vandermonde_matrix(x_values, 1), mat.generate_log_colvector(y_values)
+    if model == 'drug_concentration':
+        return mat.generate_vandermonde_matrix(x_values, 1), mat.generate_log_colvector(y_values, x_values)
+    raise ValueError(f"Unknown model '{model}', expected one of {MODELS}")
 
 class LeastSquares:
-    def __init__(self, x_values, y_values):
+    def __init__(self, x_values, y_values, method='normal'):
         """
         Initialize the LeastSquares class. Can not be multiple models at once. Default model is polynomial.
         Args:
         x_values (list): list of x values
-        y_values (list): list of y values
+        y_values (list): list of y values, or a 2D array of shape (n_points, n_series) to fit several series
+            sharing the same x values with a single factorization
+        method (str): Optional, default 'normal'. Least squares solver: 'normal' equations as shown in the plots,
+            'qr' or 'svd' for ill conditioned fits such as high degree polynomials
         """
-        self.x_values = x_values
-        self.y_values = y_values
+        self.x_values = np.asarray(x_values, dtype=np.float64)
+        self.y_values = np.asarray(y_values, dtype=np.float64)
+        self.method = method
+        self.model = None # Name of the last fitted model
+        self.degree = 1 # Degree of the polynomial model
+        self.series_shape = self.y_values.shape[1:] # () for a single series
 
         # Ac = B
         self.A_matrix = None
@@ -26,19 +66,51 @@ class LeastSquares:
         self.latex_extra = "" # Output text
         self.latex_C = "" # Initial form of C
 
+    @classmethod
+    def from_coefficients(cls, model, c_vector, degree=1, series_shape=()):
+        """
+        Create a fitted model from its c vector without data points, e.g. from a streaming fit or a saved model.
+        Only evaluation is available, the symbolic function and the plot need the data points.
+        Args:
+        model (str): one of MODELS
+        c_vector (ndarray): coefficients with one column per series
+        degree (int): Optional, default value 1. The degree of the polynomial model
+        series_shape (tuple): Optional, default (). (n_series,) for several series
+        Returns:
+        LeastSquares: the fitted model
+        """
+        if model not in MODELS:
+            raise ValueError(f"Unknown model '{model}', expected one of {MODELS}")
+        fitted = cls([], np.empty((0,) + tuple(series_shape)))
+        fitted.model = model
+        fitted.degree = degree
+        fitted.c_vector = np.asarray(c_vector, dtype=np.float64).reshape(len(c_vector), -1)
+        return fitted
+
+    def _fit(self, model, degree=1):
+        """
+        Build the linearized system Ac = b of a model and solve it in the least squares sense.
+        The symbolic function is reset, it is built from the c vector when needed.
+        """
+        with instr.stage('least_squares.design_matrix', len(self.x_values)):
+            self.A_matrix, self.b_vector = model_system(model, self.x_values, self.y_values, degree)
+        with instr.stage('least_squares.solve', len(self.x_values)):
+            self.c_vector, self.A_norm, self.b_norm = mat.solve_inconsistent_system(self.A_matrix, self.b_vector, self.method)
+        self.model = model
+        self.degree = degree
+        self.function = None
+
+    def _symbolic(self):
+        """
+        Whether the symbolic function can be built, which is only the case for a single series.
+        """
+        return self.series_shape == ()
+
     def periodic_interpolation(self):
         """
         Interpolate a periodic function with a set of points.
         """
-        A = list()
-        for x in self.x_values:
-            A.append([1, cos(2*pi*x), sin(2*pi*x)])
-        self.A_matrix = np.array(A)
-        self.b_vector = np.array(self.y_values).reshape(-1,1) # Convert y values to column vector
-
-        self.c_vector, self.A_norm, self.b_norm = mat.solve_inconsistent_system(self.A_matrix, self.b_vector)
-        x = sp.symbols('x')
-        self.function = self.c_vector[0][0] + self.c_vector[1][0] * sp.cos(2*sp.pi*x) + self.c_vector[2][0] * sp.sin(2*sp.pi*x)
+        self._fit('periodic')
         self.latex_extra = r"$y = c_0 + c_1\cos(2\pi x)+ c_2\cos(2\pi x)$ and $C = \begin{bmatrix} c_1 \\ c_2  \\ c_3 \end{bmatrix} $"
         self.latex_C = r"\begin{bmatrix} c_1 \\ c_2  \\ c_3 \end{bmatrix}"
 
@@ -47,42 +119,19 @@ class LeastSquares:
         """
         Interpolate an exponential function with a set of points.
         """
-        self.A_matrix = mat.generate_vandermonde_matrix([log(x) for x in self.x_values], 1)
-        y = sp.symbols('y')
-        fy = sp.Lambda(y, sp.ln(y))
-        self.b_vector = mat.generate_colvector_from_function(fy,self.y_values)
-        self.c_vector, self.A_norm, self.b_norm = mat.solve_inconsistent_system(self.A_matrix, self.b_vector)
+        self._fit('powerlaw')
         self.latex_extra = r"$y = c_1 x^{c_2}$" + "\n" + r"$\ln{y} = \ln{c_1}+c_2\ln{t}$" + "\n" + r"$\ln{y} = k+c_2\ln{t} $ where $k=\ln{x}$ " + "\n\n" + r"$b = \begin{bmatrix}\ln{y_1} \\ \ln{y_2} \\ \vdots \\ \ln{y_n} \end{bmatrix}$ and $ C = \begin{bmatrix} k \\ c_2 \end{bmatrix} $"
         self.latex_C = r" \begin{bmatrix} k \\ c_2 \end{bmatrix} "
-        x = sp.symbols('x')
-        c1 = sp.exp(self.c_vector[0][0])
-        c2 = self.c_vector[1][0]
-        self.function = c1*x**c2
 
     def drug_concentration_interpolation(self):
-        self.A_matrix = mat.generate_vandermonde_matrix(self.x_values, 1)
-        b_vals = [log(y) - log(x) for x,y in zip(self.x_values, self.y_values)]
-        self.b_vector = np.array(b_vals).reshape(-1,1) # Convert b vals values to column vector
-        self.c_vector, self.A_norm, self.b_norm = mat.solve_inconsistent_system(self.A_matrix, self.b_vector)
+        self._fit('drug_concentration') # b = ln(y) - ln(x)
         self.latex_extra = r"$y = c_1xe^{c_2x}$" + "\n" + r"$\ln{y} = \ln{c_1} + \ln{t} + c_2t$" + "\n" + r"$\ln{y} - \ln{t} = \ln{c_1} + c_2t = k +c_2t$ where $k=\ln{x}$" + "\n\n"+ r"$b = \begin{bmatrix}\ln{y_1} - \ln{x_1} \\ \ln{y_2}- \ln{x_2} \\ \vdots \\ \ln{y_n} - \ln{x_n}\end{bmatrix}$ and $C = \begin{bmatrix} k \\ c_2 \end{bmatrix} $"
         self.latex_C = r" \begin{bmatrix} k \\ c_2 \end{bmatrix} "
-        x = sp.symbols('x')
-        c1 = sp.exp(self.c_vector[0][0])
-        c2 = self.c_vector[1][0]
-        self.function = c1*x*sp.exp(c2*x)
 
     def exponential_interpolation(self):
-        self.A_matrix = mat.generate_vandermonde_matrix(self.x_values, 1)
-        y = sp.symbols('y')
-        fy = sp.Lambda(y, sp.ln(y))
-        self.b_vector = mat.generate_colvector_from_function(fy,self.y_values)
-        self.c_vector, self.A_norm, self.b_norm = mat.solve_inconsistent_system(self.A_matrix, self.b_vector)
+        self._fit('exponential')
         self.latex_extra = r"$y = c_1 e^{c_2t}$" + "\n" + r"$\ln{y} = \ln{c_1}+c_2t$" + "\n" + r"$\ln{y} = k+c_2t $ where $k=\ln{x}$ " + "\n\n" + r"$b = \begin{bmatrix}\ln{y_1} \\ \ln{y_2} \\ \vdots \\ \ln{y_n} \end{bmatrix}$ and $ C = \begin{bmatrix} k \\ c_2 \end{bmatrix} $"
         self.latex_C = r" \begin{bmatrix} k \\ c_2 \end{bmatrix} "
-        x = sp.symbols('x')
-        c1 = sp.exp(self.c_vector[0][0])
-        c2 = self.c_vector[1][0]
-        self.function = c1*sp.exp(c2*x)
 
     def polynomial_interpolation(self, degree = 1):
         """
@@ -90,19 +139,12 @@ class LeastSquares:
         Args:
         degree (int): Optional, default value 1. The degree of the polynome
         """
-        # Generate A matrix
-        self.A_matrix = mat.generate_vandermonde_matrix(self.x_values, degree)
-
-        self.b_vector = np.array(self.y_values).reshape(-1,1) # Convert y values to column vector
+        # Generate A matrix, convert y values to column vector and solve
+        self._fit('polynomial', degree)
 
-        self.c_vector, self.A_norm, self.b_norm = mat.solve_inconsistent_system(self.A_matrix, self.b_vector)
-        
-        self.function = 0
         self.latex_C = r"\begin{bmatrix}"
         self.latex_extra = ""
-        x = sp.symbols('x')
         for i in range(degree + 1):
-            self.function += self.c_vector[i][0] * x ** i
             if i == 0:
                 self.latex_extra += f"$y = c_{i}"
                 self.latex_C +=  f"c_{i}"
@@ -113,18 +155,152 @@ class LeastSquares:
         self.latex_C += r"\end{bmatrix}"
 
 
+    def build_function(self):
+        """
+        Build the symbolic function of the fitted model from the c vector, only needed for the symbolic/LaTeX output.
+        Returns:
+            sympy.Expr: the function, also stored in self.function
+        """
+        if self.model is None:
+            raise ValueError("No model has been fitted yet")
+        if not self._symbolic():
+            raise ValueError("The symbolic form is only available for a single series")
+
+        with instr.stage('least_squares.symbolic', len(self.c_vector)):
+            x = sp.symbols('x')
+            c = [float(value) for value in self.c_vector[:, 0]]
+            if self.model == 'polynomial':
+                self.function = sum(c[i] * x ** i for i in range(self.degree + 1))
+            elif self.model == 'periodic':
+                self.function = c[0] + c[1] * sp.cos(2*sp.pi*x) + c[2] * sp.sin(2*sp.pi*x)
+            elif self.model == 'powerlaw':
+                self.function = sp.exp(c[0])*x**c[1]
+            elif self.model == 'exponential':
+                self.function = sp.exp(c[0])*sp.exp(c[1]*x)
+            else:
+                self.function = sp.exp(c[0])*x*sp.exp(c[1]*x)
+        return self.function
+
     def evaluate_for_x(self, value):
         """
-        Evaluate the newton interpolation at a given point x
+        Evaluate the fitted model at a given point x or an array of points from the c vector, without sympy.
+        Args:
+            value (float/array): query point(s)
+        Returns:
+            float/ndarray: model value(s) with the same shape as value, followed by the series axis for several series
         """
-        x = sp.symbols('x')
-        return self.function.subs(x, value)
+        values = np.asarray(value, dtype=np.float64)
+        x = values.reshape(-1, 1)
+        c = self.c_vector
+
+        if self.model == 'polynomial':
+            result = mat.generate_vandermonde_matrix(x.ravel(), self.degree) @ c
+        elif self.model == 'periodic':
+            result = c[0] + c[1] * np.cos(2*pi*x) + c[2] * np.sin(2*pi*x)
+        elif self.model == 'powerlaw':
+            result = np.exp(c[0]) * x ** c[1]
+        elif self.model == 'exponential':
+            result = np.exp(c[0]) * np.exp(c[1] * x)
+        elif self.model == 'drug_concentration':
+            result = np.exp(c[0]) * x * np.exp(c[1] * x)
+        else:
+            raise ValueError("No model has been fitted yet")
+
+        result = result.reshape(values.shape + self.series_shape)
+        return result[()] if result.ndim == 0 else result
+
+    def derivative(self, value, order=1):
+        """
+        Evaluate a derivative of the fitted model at a given point x or an array of points, in closed form from the c vector.
+        Args:
+            value (float/array): query point(s)
+            order (int, optional): derivative order, 0 gives the model itself. Defaults to 1.
+        Returns:
+            float/ndarray: derivative value(s) with the same shape as value, followed by the series axis for several series
+        """
+        if order < 0:
+            raise ValueError("The derivative order must be positive")
+        if order == 0:
+            return self.evaluate_for_x(value)
+        values = np.asarray(value, dtype=np.float64)
+        x = values.reshape(-1, 1)
+        c = self.c_vector
+
+        if self.model == 'polynomial':
+            if order > self.degree:
+                result = np.zeros((len(x), c.shape[1]))
+            else:
+                derived = np.polynomial.polynomial.polyder(c, order, axis=0)
+                result = mat.generate_vandermonde_matrix(x.ravel(), self.degree - order) @ derived
+        elif self.model == 'periodic':
+            # Each derivative multiplies by 2pi and shifts the phase by pi/2
+            phase = 2*pi*x + order * pi / 2
+            result = (2*pi)**order * (c[1] * np.cos(phase) + c[2] * np.sin(phase))
+        elif self.model == 'powerlaw':
+            # c_1 p(p-1)...(p-order+1) x^(p-order)
+            falling = np.prod([c[1] - j for j in range(order)], axis=0)
+            result = np.exp(c[0]) * falling * x ** (c[1] - order)
+        elif self.model == 'exponential':
+            result = np.exp(c[0]) * c[1]**order * np.exp(c[1] * x)
+        elif self.model == 'drug_concentration':
+            # (x e^(rx))^(k) = e^(rx) (r^k x + k r^(k-1))
+            result = np.exp(c[0]) * np.exp(c[1] * x) * (c[1]**order * x + order * c[1]**(order - 1))
+        else:
+            raise ValueError("No model has been fitted yet")
+
+        result = result.reshape(values.shape + self.series_shape)
+        return result[()] if result.ndim == 0 else result
+
+    def antiderivative(self, x):
+        """
+        Antiderivative of the fitted model, in closed form from the c vector.
+        Args:
+            x (ndarray): (n, 1) column of points
+        Returns:
+            ndarray: (n, n_series) values
+        """
+        c = self.c_vector
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.model == 'polynomial':
+                return mat.generate_vandermonde_matrix(x.ravel(), self.degree + 1) @ np.polynomial.polynomial.polyint(c, axis=0)
+            if self.model == 'periodic':
+                return c[0] * x + (c[1] * np.sin(2*pi*x) - c[2] * np.cos(2*pi*x)) / (2*pi)
+            if self.model == 'powerlaw':
+                power = c[1] + 1
+                return np.exp(c[0]) * np.where(power == 0, np.log(x), x ** power / power)
+            if self.model == 'exponential':
+                return np.exp(c[0]) * np.where(c[1] == 0, x, np.exp(c[1] * x) / c[1])
+            if self.model == 'drug_concentration':
+                return np.exp(c[0]) * np.where(c[1] == 0, x**2 / 2, np.exp(c[1] * x) * (x / c[1] - 1 / c[1]**2))
+        raise ValueError("No model has been fitted yet")
+
+    def integrate(self, a, b):
+        """
+        Definite integral of the fitted model from a to b, in closed form from the c vector.
+        Args:
+            a (float/array): lower bound(s)
+            b (float/array): upper bound(s), broadcast against a
+        Returns:
+            float/ndarray: integral(s) with the broadcast shape of a and b, followed by the series axis for several series
+        """
+        a, b = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+        result = self.antiderivative(b.reshape(-1, 1)) - self.antiderivative(a.reshape(-1, 1))
+        result = result.reshape(a.shape + self.series_shape)
+        return result[()] if result.ndim == 0 else result
     
-    def plot(self, num_points=100):
-        """Plot the interpolation polynomial and data points."""
-        # Ensure we have the polynomial
+    def plot(self, num_points=100, path=None):
+        """
+        Plot the interpolation polynomial and data points.
+        Args:
+            path (str, optional): save the figures to this image file instead of showing them
+        Returns:
+            list: paths of the saved images
+        """
+        # Ensure we have the symbolic function
+        if self.model is None:
+            return []
         if self.function is None:
-            return
+            self.build_function()
 
         _, graph = plt.create_fig(1) # First figure window to contain graph 
         _, steps = plt.create_fig(1) # Second figure window to contain the steps
@@ -132,6 +308,10 @@ class LeastSquares:
         # Plot a graph on the first subplot of first figure
         plt.plot_graph(graph, self.x_values, self.y_values, self.function, ' Least Squares Interpolation')
 
+        # The normal equations are only formed by the normal solver, derive them for the other solvers
+        if self.A_norm is None:
+            self.A_norm, self.b_norm = mat.normal_equations(self.A_matrix, self.b_vector)
+
         # Write the polynomials on the second subplot of first figure
         sp_A = sp.Matrix(self.A_matrix.tolist())
         sp_A_norm = sp.Matrix(self.A_norm.tolist())
@@ -148,5 +328,5 @@ class LeastSquares:
         plt.write_text(steps, text)
 
         # Show the entire figures with all subplots
-        plt.show()
+        return plt.show(path)
 
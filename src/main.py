@@ -1,7 +1,13 @@
-from newton_interpolation import NewtonInterpolation
-from cubic_splines import CubicSplineInterpolation
-from least_squares import LeastSquares
+import argparse
+import sys
 from fractions import Fraction
+from newton_interpolation import NewtonInterpolation
+from cubic_splines import CubicSplineInterpolation, BOUNDARY_CONDITIONS
+from least_squares import LeastSquares, MODELS
+from barycentric_interpolation import BarycentricInterpolation
+from smoothing_spline import SmoothingSpline
+from utils.data_io import read_points, read_query, write_results
+import utils.plotting as plt
 
 def take_n_points(n: int):
     x_vals = list()
@@ -13,40 +19,45 @@ def take_n_points(n: int):
         y_vals.append(y)
     return x_vals, y_vals
 
-print("Notice: If you can't run latex in matplotlib, you can still see the latex text as output in console.")
-n = int(input("Enter the number of input points(x,y): "))
-x_points, y_points = take_n_points(n)
+def interactive():
+    """
+    Interactive mode: read the points with input() and plot the selected methods.
+    """
+    print("Notice: If you can't run latex in matplotlib, you can still see the latex text as output in console.")
+    n = int(input("Enter the number of input points(x,y): "))
+    x_points, y_points = take_n_points(n)
 
-print("""
+    print("""
 Select the interpolation method:
     1. Newton Interpolation
     2. Cubic Spline Interpolation
     3. Least Squares Model Interpolation
+    4. Barycentric Interpolation
     0. Exit
     """)
 
-choice = int(input("Enter your choice: "))
-while choice != 0:
-
-    if choice == 1:
-        newton = NewtonInterpolation(x_points,y_points)
-        newton.interpolate()
-        newton.plot()
-
-    elif choice == 2:
-        w0 = input("Enter weight w_0 (leave empty for default value 0): ")
-        w0 = int(w0) if w0.isdigit() else 0
-        wn = input("Enter weight w_n (leave empty for default value 0): ")
-        wn = int(wn) if wn .isdigit() else 0
-
-        spline = CubicSplineInterpolation(x_points,y_points, w0, wn)
-        spline.generate_splines()
-        print("for x = 3: ")
-        print(spline.evaluate_for_x(-3))
-        spline.plot()
-    
-    elif choice == 3:
-        print("""
+    choice = int(input("Enter your choice: "))
+    while choice != 0:
+
+        if choice == 1:
+            newton = NewtonInterpolation(x_points,y_points)
+            newton.interpolate()
+            newton.plot()
+
+        elif choice == 2:
+            w0 = input("Enter weight w_0 (leave empty for default value 0): ")
+            w0 = int(w0) if w0.isdigit() else 0
+            wn = input("Enter weight w_n (leave empty for default value 0): ")
+            wn = int(wn) if wn .isdigit() else 0
+
+            spline = CubicSplineInterpolation(x_points,y_points, w0, wn)
+            spline.generate_splines()
+            print("for x = 3: ")
+            print(spline.evaluate_for_x(-3))
+            spline.plot()
+
+        elif choice == 3:
+            print("""
 Select the model:
     1. Polynomial Degree n Model
     2. Powerlaw Model
@@ -54,31 +65,130 @@ Select the model:
     4. Drug Concentration Model
     5. Exponential Interpolation
     0. Back""")
-        model = LeastSquares(x_points, y_points)
-        model_choice = -1
-        while model_choice != 0:
-            model_choice = int(input("Enter your model choice: "))
-            if model_choice == 1:
-                degree = int(input("Enter the degree of the polynomial model: "))
-                model.polynomial_interpolation(degree)
-                model.plot()
-            elif model_choice == 2:
-                model.powerlaw_interpolation()
-                model.plot()
-            elif model_choice == 3:
-                model.periodic_interpolation()
-                model.plot()
-            elif model_choice == 4:
-                model.drug_concentration_interpolation()
-                model.plot()
-            elif model_choice == 5:
-                model.exponential_interpolation()
-                model.plot()
-            elif model_choice != 0:
-                print("Enter a valid choice")
+            model = LeastSquares(x_points, y_points)
+            model_choice = -1
+            while model_choice != 0:
                 model_choice = int(input("Enter your model choice: "))
-                
+                if model_choice == 1:
+                    degree = int(input("Enter the degree of the polynomial model: "))
+                    model.polynomial_interpolation(degree)
+                    model.plot()
+                elif model_choice == 2:
+                    model.powerlaw_interpolation()
+                    model.plot()
+                elif model_choice == 3:
+                    model.periodic_interpolation()
+                    model.plot()
+                elif model_choice == 4:
+                    model.drug_concentration_interpolation()
+                    model.plot()
+                elif model_choice == 5:
+                    model.exponential_interpolation()
+                    model.plot()
+                elif model_choice != 0:
+                    print("Enter a valid choice")
+                    model_choice = int(input("Enter your model choice: "))
+
+        elif choice == 4:
+            barycentric = BarycentricInterpolation(x_points, y_points)
+            barycentric.plot()
+
+        else:
+            print("Invalid choice")  # This will be executed if the choice is neither 1 nor
+        choice = int(input("Enter your choice again to choose another method: "))
+
+def build_parser():
+    """
+    Build the command line parser with one subcommand per interpolation method.
+    """
+    parser = argparse.ArgumentParser(description="Interpolate data points. Run without arguments for the interactive mode.")
+    subparsers = parser.add_subparsers(dest='method', required=True)
+
+    def add_common(subparser):
+        subparser.add_argument('input', help="data points as .npy or CSV (x, y1, y2, ...), '-' for CSV on stdin")
+        query = subparser.add_mutually_exclusive_group()
+        query.add_argument('--query', help="query points as .npy or CSV (first column), '-' for CSV on stdin")
+        query.add_argument('--grid', help="evenly spaced query points as start:stop:num")
+        subparser.add_argument('--output', default='-', help="results file (.npy or CSV), '-' for stdout (default)")
+        subparser.add_argument('--plot', action='store_true', help="plot the interpolation (needs a single series)")
+        subparser.add_argument('--save-plot', help="save the plot to this image file, headless, instead of showing it")
+        subparser.add_argument('--latex', action='store_true', help="print the LaTeX form of the result to stderr")
+
+    add_common(subparsers.add_parser('newton', help="Newton interpolation"))
+    add_common(subparsers.add_parser('barycentric', help="barycentric Lagrange interpolation"))
+
+    spline = subparsers.add_parser('spline', help="cubic spline interpolation")
+    add_common(spline)
+    spline.add_argument('--w0', type=float, default=0, help="weight w_0 at the start (default 0)")
+    spline.add_argument('--wn', type=float, default=0, help="weight w_n at the end (default 0)")
+    spline.add_argument('--boundary', choices=BOUNDARY_CONDITIONS, default='natural', help="boundary condition (default natural)")
+    spline.add_argument('--d0', type=float, default=0, help="first derivative at the start for the clamped boundary (default 0)")
+    spline.add_argument('--dn', type=float, default=0, help="first derivative at the end for the clamped boundary (default 0)")
+
+    smoothing = subparsers.add_parser('smoothing-spline', help="penalized regression spline for noisy data")
+    add_common(smoothing)
+    smoothing.add_argument('--segments', type=int, help="number of knot intervals (default: points/4, at most 100)")
+    smoothing.add_argument('--smoothing', type=float, help="smoothing parameter (default: chosen by cross validation)")
+
+    least_squares = subparsers.add_parser('least-squares', help="least squares model fitting")
+    add_common(least_squares)
+    least_squares.add_argument('--model', choices=MODELS, default='polynomial', help="model to fit (default polynomial)")
+    least_squares.add_argument('--degree', type=int, default=1, help="degree of the polynomial model (default 1)")
+    least_squares.add_argument('--solver', choices=('normal', 'qr', 'svd'), default='normal', help="least squares solver (default normal)")
+    return parser
+
+def fit(args, x_points, y_points):
+    """
+    Fit the interpolation selected by the parsed arguments.
+    Returns:
+        tuple: fitted object and a function returning its sympy form for the LaTeX output
+    """
+    if args.method == 'newton':
+        model = NewtonInterpolation(x_points, y_points)
+        return model, lambda: (model.interpolate(), model.polynomial)[1]
+    if args.method == 'barycentric':
+        model = BarycentricInterpolation(x_points, y_points)
+        return model, lambda: (model.interpolate(), model.polynomial)[1]
+    if args.method == 'spline':
+        model = CubicSplineInterpolation(x_points, y_points, args.w0, args.wn, boundary=args.boundary, d0=args.d0, dn=args.dn)
+        return model, lambda: (model.generate_splines(), model.piecewise)[1]
+    if args.method == 'smoothing-spline':
+        model = SmoothingSpline(x_points, y_points, args.segments, args.smoothing)
+        spline = model.to_cubic_spline()
+        return model, lambda: (spline.generate_splines(), spline.piecewise)[1]
+
+    model = LeastSquares(x_points, y_points, args.solver)
+    if args.model == 'polynomial':
+        model.polynomial_interpolation(args.degree)
     else:
-        print("Invalid choice")  # This will be executed if the choice is neither 1 nor
-    choice = int(input("Enter your choice again to choose another method: "))
+        getattr(model, args.model + '_interpolation')()
+    return model, model.build_function
+
+def run(args):
+    """
+    Run a parsed command: fit the points, evaluate at the query points, then write, print and plot as requested.
+    """
+    x_points, y_points = read_points(args.input)
+    model, symbolic = fit(args, x_points, y_points)
+
+    query = read_query(args.query, args.grid)
+    if query is not None:
+        write_results(args.output, query, model.evaluate_for_x(query))
+    if args.latex:
+        import sympy as sp
+        print(sp.latex(symbolic()), file=sys.stderr)
+    if args.save_plot:
+        plt.configure(headless=True)
+        model.plot(path=args.save_plot)
+    elif args.plot:
+        model.plot()
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        interactive()
+        return
+    run(build_parser().parse_args(argv))
 
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,151 @@
-import sympy as sp
+import math
+import warnings
+import numpy as np
+from utils.lazy_import import lazy_import
 from utils.divided_differences import calculate_divided_differences, beautify_difftable
+from utils.nodes import chebyshev_points, leja_order
+import utils.matrix_operations as mat
 import utils.plotting as plt
+import utils.instrumentation as instr
+
+sp = lazy_import('sympy') # Only loaded for the symbolic/LaTeX output
 
 class NewtonInterpolation:
-    def __init__(self, x_points, y_points):
+    def __init__(self, x_points, y_points, coefficients=None):
         """
-        Initialize Newton Interpolation with data points, and automatically stores the result of
-        the divided differences calculation of x and y
-        
+        Initialize Newton Interpolation with data points, and automatically stores the
+        Newton coefficients f[x0], f[x0,x1], ... of the divided differences of x and y.
+        The full divided differences table is only calculated when it is displayed.
+
         Args:
             x_points (list/array): x coordinates
-            y_points (list/array): y coordinates
+            y_points (list/array): y coordinates, or a 2D array of shape (n_points, n_series) to interpolate
+                several series sharing the same x values at once
+            coefficients (list/array, optional): already calculated Newton coefficients, e.g. of a saved model. Defaults to None.
         """
-        self.difftable = calculate_divided_differences(x_points,y_points)
-        #x_values = self.difftable[0]
-        #y_values = self.difftable[1]
+        self.x_values = np.asarray(x_points, dtype=np.float64)
+        self.y_values = np.asarray(y_points, dtype=np.float64)
+        if coefficients is None:
+            with instr.stage('newton.coefficients', len(self.x_values)):
+                self.coefficients = calculate_divided_differences(self.x_values, self.y_values, diagonal_only=True)
+        else:
+            self.coefficients = np.asarray(coefficients, dtype=np.float64)
+        self.last_diagonal = None # f[xn], f[xn-1,xn], ... needed to append points, calculated on first use
+        self.error_estimate = None # Prediction error at the next candidate nodes of an adaptive interpolation
 
+        self.difftable = None
         self.polynomial = None
         self.latex_polynomial = None
-    
+
+    @classmethod
+    def adaptive(cls, source, interval=None, tol=1e-10, max_degree=64, patience=3):
+        """
+        Build the lowest degree interpolation that is accurate enough, on Chebyshev points instead of the given ones
+        to avoid the Runge oscillations of equispaced points. The candidate nodes are taken in Leja order and added
+        one at a time with add_point, until the interpolation predicts the next `patience` candidates within
+        tol. The prediction error at a node is the size of the term its Newton coefficient would add.
+        Args:
+            source (callable/tuple): function of x to sample, or (x_points, y_points) dense samples whose points
+                closest to the Chebyshev points are used
+            interval (tuple, optional): (a, b) interval of a function. Defaults to the range of the samples.
+            tol (float, optional): prediction error tolerance, relative to the largest |y|. Defaults to 1e-10.
+            max_degree (int, optional): highest degree. Defaults to 64.
+            patience (int, optional): number of upcoming candidates that must be predicted within tol. Defaults to 3.
+        Returns:
+            NewtonInterpolation: the interpolation, with its last prediction error in error_estimate
+        """
+        if callable(source):
+            if interval is None:
+                raise ValueError("The interval is required to sample a function")
+            candidates = chebyshev_points(interval[0], interval[1], max_degree + patience + 1)
+            samples = list()
+        else:
+            x_samples = np.asarray(source[0], dtype=np.float64)
+            y_samples = np.asarray(source[1], dtype=np.float64)
+            order = np.argsort(x_samples)
+            x_samples, y_samples = x_samples[order], y_samples[order]
+            a, b = interval if interval is not None else (x_samples[0], x_samples[-1])
+            # Closest sample to each Chebyshev point, each sample used once
+            targets = chebyshev_points(a, b, max_degree + patience + 1)
+            right = np.clip(np.searchsorted(x_samples, targets), 1, len(x_samples) - 1)
+            closest = np.where(targets - x_samples[right - 1] <= x_samples[right] - targets, right - 1, right)
+            closest = np.unique(closest)
+            candidates = x_samples[closest]
+            samples = list(y_samples[closest][leja_order(candidates)])
+
+        nodes = candidates[leja_order(candidates)]
+
+        def value(k):
+            # Sample the function only at the nodes that are actually used or checked
+            while len(samples) <= k:
+                samples.append(np.asarray(source(nodes[len(samples)]), dtype=np.float64))
+            return samples[k]
+
+        interpolation = cls(nodes[:1], [value(0)])
+        count = 1
+        while count < len(nodes):
+            upcoming = list(range(count, min(count + patience, len(nodes))))
+            expected = np.array([value(k) for k in upcoming])
+            scale = max(np.abs(interpolation.y_values).max(), np.abs(expected).max(), np.finfo(np.float64).tiny)
+            interpolation.error_estimate = np.abs(interpolation.evaluate_for_x(nodes[upcoming]) - expected).max()
+            if interpolation.error_estimate <= tol * scale:
+                break
+            if count > max_degree:
+                warnings.warn(f"Adaptive interpolation did not reach tol = {tol} up to degree {max_degree}, "
+                              f"error estimate {interpolation.error_estimate:.3g}")
+                break
+            interpolation.add_point(nodes[count], expected[0])
+            count += 1
+        return interpolation
+
+    def add_point(self, x_point, y_point):
+        """
+        Add a data point to the interpolation in O(n) by calculating only the new diagonal of divided
+        differences f[xn+1], f[xn,xn+1], ..., f[x0,...,xn+1] and appending its last value as a new coefficient.
+        Args:
+            x_point (float): x coordinate, must differ from the existing x values
+            y_point (float/array): y coordinate, one per series for several series
+        """
+        if np.any(self.x_values == x_point):
+            raise ValueError(f"x = {x_point} is already an interpolation point")
+        if self.last_diagonal is None:
+            # Divided differences are symmetric, so the Newton coefficients of the reversed points are the last diagonal
+            self.last_diagonal = calculate_divided_differences(self.x_values[::-1], self.y_values[::-1], diagonal_only=True)
+
+        n = len(self.x_values)
+        with instr.stage('newton.add_point', n + 1):
+            diagonal = np.empty((n + 1,) + self.y_values.shape[1:])
+            diagonal[0] = y_point
+            for j in range(1, n + 1):
+                diagonal[j] = (diagonal[j-1] - self.last_diagonal[j-1]) / (x_point - self.x_values[n-j])
+
+        self.last_diagonal = diagonal
+        self.coefficients = np.concatenate((self.coefficients, diagonal[n:]))
+        self.x_values = np.append(self.x_values, x_point)
+        self.y_values = np.concatenate((self.y_values, diagonal[:1]))
+
+        # Symbolic results are outdated, they will be rebuilt when needed
+        self.difftable = None
+        self.polynomial = None
+        self.latex_polynomial = None
+
+    def extend(self, x_points, y_points):
+        """
+        Add several data points to the interpolation, one at a time.
+        Args:
+            x_points (list/array): x coordinates
+            y_points (list/array): y coordinates
+        """
+        if len(x_points) != len(y_points):
+            raise ValueError("x_points and y_points must have the same length")
+        for x_point, y_point in zip(x_points, y_points):
+            self.add_point(x_point, y_point)
+
     def interpolate(self):
-        """Calculate Newton interpolation polynomial."""
-        
+        """Calculate the symbolic Newton interpolation polynomial, only needed for the symbolic/LaTeX output."""
+        if self.y_values.ndim > 1:
+            raise ValueError("The symbolic form is only available for a single series")
+
         # Create symbolic polynomial
         x = sp.symbols('x')
         poly = 0
@@ -30,36 +154,106 @@ class NewtonInterpolation:
         xProduct = 1 #(x-x0)(x-x1)...
         latex_xProduct = "" # Latex form of xProduct
 
-        for col in range(1,len(self.difftable)): # from y column until the last divided difference column
+        for col in range(len(self.coefficients)): # from y column until the last divided difference column
 
-            coefficient = self.difftable[col][0]
+            coefficient = float(self.coefficients[col])
 
-            if col != 1:
-                xProduct *= (x - self.difftable[0][col-2]) 
-                latex_xProduct += f"(x - {self.difftable[0][col-2]})"
+            if col != 0:
+                x_node = float(self.x_values[col-1])
+                xProduct *= (x - x_node)
+                latex_xProduct += f"(x - {x_node})"
 
             poly += coefficient * xProduct # a0*(x-x0)(x-x1)...
 
-            if col != 1: 
-                latex_poly += f"+ {coefficient} * " + latex_xProduct
+            if col != 0:
+                latex_poly += f"+ {round(coefficient, 4)} * " + latex_xProduct
             else:
-                latex_poly += f"{coefficient}"
+                latex_poly += f"{round(coefficient, 4)}"
 
-        self.polynomial = sp.expand(poly)
+        with instr.stage('newton.expand', len(self.coefficients)):
+            self.polynomial = sp.expand(poly)
         self.latex_polynomial = latex_poly
 
     def evaluate_for_x(self, value):
         """
-        Evaluate the newton interpolation at a given point x
+        Evaluate the newton interpolation at a given point x or an array of points
+        with the nested Horner scheme a0 + (x-x0)(a1 + (x-x1)(a2 + ...)).
+        Args:
+            value (float/array): query point(s)
+        Returns:
+            float/ndarray: interpolated value(s) with the same shape as value, followed by the series axis for several series
         """
-        x = sp.symbols('x')
-        return self.polynomial.subs(x, value)
-    
-    def plot(self, num_points=100):
-        """Plot the interpolation polynomial and data points."""
-        # Ensure we have the polynomial
+        values = np.asarray(value, dtype=np.float64)
+        flat = values.reshape(-1)
+        ndim = self.coefficients.ndim
+        with instr.stage('newton.evaluate', flat.size):
+            result = np.broadcast_to(self.coefficients[-1], flat.shape + self.coefficients.shape[1:])
+            for k in range(len(self.coefficients) - 2, -1, -1):
+                result = result * mat.as_column(flat - self.x_values[k], ndim) + self.coefficients[k]
+        result = result.reshape(values.shape + self.coefficients.shape[1:])
+        return result[()] if result.ndim == 0 else result
+
+    def derivative(self, value, order=1):
+        """
+        Evaluate a derivative of the newton interpolation at a given point x or an array of points.
+        The Horner scheme is extended to carry the Taylor coefficients p^(j)(x)/j! for j <= order,
+        each step r_j = r_j (x-x_k) + r_j-1 and r_0 = r_0 (x-x_k) + a_k.
+        Args:
+            value (float/array): query point(s)
+            order (int, optional): derivative order, 0 gives the polynomial itself. Defaults to 1.
+        Returns:
+            float/ndarray: derivative value(s) with the same shape as value, followed by the series axis for several series
+        """
+        if order < 0:
+            raise ValueError("The derivative order must be positive")
+        values = np.asarray(value, dtype=np.float64)
+        flat = values.reshape(-1)
+        ndim = self.coefficients.ndim
+        shape = flat.shape + self.coefficients.shape[1:]
+        with instr.stage('newton.derivative', flat.size):
+            taylor = [np.broadcast_to(self.coefficients[-1], shape)] + [np.zeros(shape) for _ in range(order)]
+            for k in range(len(self.coefficients) - 2, -1, -1):
+                dx = mat.as_column(flat - self.x_values[k], ndim)
+                for j in range(order, 0, -1):
+                    taylor[j] = taylor[j] * dx + taylor[j-1]
+                taylor[0] = taylor[0] * dx + self.coefficients[k]
+            result = math.factorial(order) * taylor[order]
+        result = result.reshape(values.shape + self.coefficients.shape[1:])
+        return result[()] if result.ndim == 0 else result
+
+    def integrate(self, a, b):
+        """
+        Definite integral of the newton interpolation from a to b, with a Gauss-Legendre rule
+        which is exact for the polynomial degree.
+        Args:
+            a (float/array): lower bound(s)
+            b (float/array): upper bound(s), broadcast against a
+        Returns:
+            float/ndarray: integral(s) with the broadcast shape of a and b, followed by the series axis for several series
+        """
+        a, b = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+        nodes, weights = np.polynomial.legendre.leggauss(len(self.coefficients) // 2 + 1)
+        with instr.stage('newton.integrate', a.size):
+            half_width = (b.reshape(-1, 1) - a.reshape(-1, 1)) / 2
+            points = half_width * nodes + (a.reshape(-1, 1) + b.reshape(-1, 1)) / 2
+            values = self.evaluate_for_x(points) # (n_bounds, n_nodes) followed by the series axis
+            result = np.tensordot(weights, np.moveaxis(values, 1, 0), axes=1) * mat.as_column(half_width.ravel(), values.ndim - 1)
+        result = result.reshape(a.shape + self.coefficients.shape[1:])
+        return result[()] if result.ndim == 0 else result
+
+    def plot(self, num_points=100, path=None):
+        """
+        Plot the interpolation polynomial and data points.
+        Args:
+            path (str, optional): save the figures to this image file instead of showing them
+        Returns:
+            list: paths of the saved images
+        """
+        # Ensure we have the polynomial and table
         if self.polynomial is None:
             self.interpolate()
+        if self.difftable is None:
+            self.difftable = calculate_divided_differences(self.x_values, self.y_values)
 
         _, axes = plt.create_fig(2) # First figure window to contain graph and polynomials
         _, tableax = plt.create_fig(1) # Second figure window to contain the table
@@ -76,4 +270,4 @@ class NewtonInterpolation:
         plt.write_text(axes[1], "Deduced Polynomial from table:\n $P(x)=" + self.latex_polynomial +"$\n\nExpanded Form:\n$P(x)=" + sp.latex(self.polynomial) + "$")
 
         # Show the entire figures with all subplots
-        plt.show()
+        return plt.show(path)
@@ -0,0 +1,207 @@
+import argparse
+import os
+import sys
+from collections import OrderedDict
+from hashlib import blake2b
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from cubic_splines import CubicSplineInterpolation
+import utils.instrumentation as instr
+
+DEFAULT_BLOCK_SIZE = 1 << 20 # Query points per block, about 8 MiB of float64 per array
+OPERATOR_CACHE_SIZE = 16 # Number of (knots, grid) evaluation operators kept
+_operator_cache = OrderedDict()
+
+def open_queries(path, dtype='<f8'):
+    """
+    Map a file of query points read-only without loading it.
+    Args:
+        path (str): .npy file of a 1D array, or raw binary file of dtype values
+        dtype (str, optional): dtype of a raw binary file. Defaults to little endian float64.
+    Returns:
+        np.memmap: the query points
+    """
+    if path.endswith('.npy'):
+        queries = np.load(path, mmap_mode='r')
+    else:
+        queries = np.memmap(path, dtype=dtype, mode='r')
+    if queries.ndim != 1:
+        raise ValueError(f"{path} must hold a 1D array of query points, got shape {queries.shape}")
+    return queries
+
+def open_output(path, shape):
+    """
+    Create a float64 output file of the given shape, mapped in memory for writing.
+    Args:
+        path (str): .npy file, or raw little endian float64 binary file for any other extension
+        shape (tuple): (n_queries,) followed by the series axis for several series
+    Returns:
+        np.memmap: the writable output
+    """
+    if path.endswith('.npy'):
+        return np.lib.format.open_memmap(path, mode='w+', dtype='<f8', shape=shape)
+    return np.memmap(path, dtype='<f8', mode='w+', shape=shape)
+
+def evaluate_block(spline, queries, output, start, stop, assume_sorted=None):
+    """
+    Evaluate the spline on one block of queries and write the values to the same block of the output.
+    Args:
+        spline (CubicSplineInterpolation): fitted spline
+        queries (ndarray): all query points, usually memory-mapped
+        output (ndarray): all output values, usually memory-mapped
+        start (int): first query of the block
+        stop (int): one after the last query of the block
+        assume_sorted (bool, optional): whether the queries are sorted, checked on the block when None
+    """
+    block = np.asarray(queries[start:stop], dtype=np.float64)
+    with instr.stage('resample.block', len(block)):
+        is_sorted = assume_sorted if assume_sorted is not None else bool(np.all(block[1:] >= block[:-1]))
+        idx = spline.locate_sorted(block) if is_sorted else spline.locate(block)
+        output[start:stop] = spline.evaluate_segments(block, idx)
+
+def resample(spline, queries, output, block_size=DEFAULT_BLOCK_SIZE, max_workers=None, assume_sorted=None, dtype='<f8'):
+    """
+    Evaluate a cubic spline on query points too large for memory, block by block from a memory-mapped file
+    to a memory-mapped output file. Blocks are evaluated in parallel by threads, as NumPy releases the GIL,
+    and only a few blocks are in flight at once so the peak memory does not depend on the file size.
+    Sorted blocks are located with a merge sweep over the knots instead of a binary search per point.
+    Args:
+        spline (CubicSplineInterpolation): fitted spline, with one or several series
+        queries (str/ndarray): .npy or raw binary file of query points, or an array
+        output (str/ndarray): .npy or raw binary output file, or an array of shape (n_queries,) + series shape
+        block_size (int, optional): query points per block. Defaults to DEFAULT_BLOCK_SIZE.
+        max_workers (int, optional): number of threads. Defaults to the number of CPUs.
+        assume_sorted (bool, optional): whether the queries are sorted, checked on every block when None. Defaults to None.
+        dtype (str, optional): dtype of a raw binary query file. Defaults to little endian float64.
+    Returns:
+        ndarray: the output array
+    """
+    if isinstance(queries, str):
+        queries = open_queries(queries, dtype)
+    shape = (len(queries),) + spline.y_values.shape[1:]
+    if isinstance(output, str):
+        output = open_output(output, shape)
+    elif output.shape != shape:
+        raise ValueError(f"Output has shape {output.shape}, expected {shape}")
+
+    max_workers = max_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for start in range(0, len(queries), block_size):
+            # Bound the number of blocks in flight, each one holds its queries and temporaries
+            if len(pending) >= 2 * max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            pending.add(executor.submit(evaluate_block, spline, queries, output, start,
+                                        min(start + block_size, len(queries)), assume_sorted))
+        for future in pending:
+            future.result()
+
+    if isinstance(output, np.memmap):
+        output.flush()
+    return output
+
+class ResamplingOperator:
+    def __init__(self, knots, grid):
+        """
+        Linear operator evaluating any cubic spline on the given knots at a fixed grid of query points.
+        A spline value only depends on y_i, y_i+1, w_i and w_i+1 of its segment, so the operator is stored as
+        a sparse matrix with 4 entries per grid point (column indices and weights, ELL layout) over the
+        concatenated [y_0 ... y_n, w_0 ... w_n]. The segment search and the local weights are computed once,
+        then evaluating a spline is one sparse matrix-vector product, or matrix-matrix for several series.
+        Args:
+            knots (array): sorted knots x_0 ... x_n of the splines
+            grid (array): query points, outside [x_0, x_n] they evaluate to nan
+        """
+        self.knots = np.array(knots, dtype=np.float64)
+        self.grid = np.array(grid, dtype=np.float64)
+        flat = self.grid.reshape(-1)
+        n = len(self.knots)
+
+        # Same segment rules as CubicSplineInterpolation.locate
+        idx = np.searchsorted(self.knots, flat, side='right') - 1
+        idx[flat == self.knots[-1]] = n - 2
+        self.outside = (flat < self.knots[0]) | (flat > self.knots[-1]) | np.isnan(flat)
+        idx[self.outside] = 0
+
+        h = self.knots[idx + 1] - self.knots[idx]
+        dx_left = flat - self.knots[idx]        # x - xi
+        dx_right = self.knots[idx + 1] - flat   # xi+1 - x
+        self.columns = np.stack((idx, idx + 1, n + idx, n + idx + 1), axis=1)
+        self.weights = np.stack((dx_right / h, dx_left / h,
+                                 dx_right**3 / (6 * h) - h * dx_right / 6,
+                                 dx_left**3 / (6 * h) - h * dx_left / 6), axis=1)
+        self.weights[self.outside] = 0
+
+    def apply(self, spline=None, y_values=None, w_values=None):
+        """
+        Evaluate a spline on the grid.
+        Args:
+            spline (CubicSplineInterpolation, optional): spline on the same knots
+            y_values (ndarray, optional): y values on the knots instead of a spline, (n+1,) or (n+1, n_series)
+            w_values (ndarray, optional): weights on the knots instead of a spline, same shape as y_values
+        Returns:
+            ndarray: values with the shape of the grid, followed by the series axis for several series
+        """
+        if spline is not None:
+            if not np.array_equal(spline.x_values, self.knots):
+                raise ValueError("The spline knots differ from the operator knots")
+            y_values, w_values = spline.y_values, spline.w_values
+        stacked = np.concatenate((np.asarray(y_values, dtype=np.float64), np.asarray(w_values, dtype=np.float64)))
+        if len(stacked) != 2 * len(self.knots):
+            raise ValueError(f"Expected {len(self.knots)} y and w values, got {len(y_values)} and {len(w_values)}")
+
+        with instr.stage('resample.operator', len(self.columns)):
+            # Sum of the 4 weighted entries of each row
+            result = np.einsum('qp,qp...->q...', self.weights, stacked[self.columns])
+            result[self.outside] = np.nan
+        result = result.reshape(self.grid.shape + stacked.shape[1:])
+        return result[()] if result.ndim == 0 else result
+
+def evaluation_operator(knots, grid):
+    """
+    ResamplingOperator of the knots and grid, reused from a cache of the OPERATOR_CACHE_SIZE last ones.
+    Args:
+        knots (array): sorted knots of the splines
+        grid (array): query points
+    Returns:
+        ResamplingOperator: the operator
+    """
+    knots = np.ascontiguousarray(knots, dtype=np.float64)
+    grid = np.ascontiguousarray(grid, dtype=np.float64)
+    key = (knots.shape, grid.shape, blake2b(knots.data, digest_size=16).digest(), blake2b(grid.data, digest_size=16).digest())
+    if key in _operator_cache:
+        _operator_cache.move_to_end(key)
+        return _operator_cache[key]
+    operator = _operator_cache[key] = ResamplingOperator(knots, grid)
+    if len(_operator_cache) > OPERATOR_CACHE_SIZE:
+        _operator_cache.popitem(last=False)
+    return operator
+
+def clear_operator_cache():
+    """
+    Remove every cached evaluation operator.
+    """
+    _operator_cache.clear()
+
+def main(argv=None):
+    from serialization import load_model # Only needed from the command line
+    parser = argparse.ArgumentParser(description="Evaluate a saved cubic spline on a file of query points, out of core.")
+    parser.add_argument('model', help="spline saved with serialization.save_model")
+    parser.add_argument('queries', help="query points as .npy or raw binary")
+    parser.add_argument('output', help="output values as .npy or raw little endian float64")
+    parser.add_argument('--dtype', default='<f8', help="dtype of a raw binary query file (default <f8)")
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE, help=f"query points per block (default {DEFAULT_BLOCK_SIZE})")
+    parser.add_argument('--workers', type=int, help="number of threads (default: number of CPUs)")
+    parser.add_argument('--sorted', action='store_true', help="the queries are sorted, skip the per block check")
+    args = parser.parse_args(argv)
+
+    spline = load_model(args.model)
+    if not isinstance(spline, CubicSplineInterpolation):
+        parser.error(f"{args.model} is not a cubic spline")
+    resample(spline, args.queries, args.output, args.block_size, args.workers, True if args.sorted else None, args.dtype)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import json
+import struct
+import numpy as np
+from newton_interpolation import NewtonInterpolation
+from cubic_splines import CubicSplineInterpolation
+from barycentric_interpolation import BarycentricInterpolation
+from least_squares import LeastSquares
+
+# File layout:
+#   header   MAGIC (8 bytes), format version (uint32), metadata length (uint32), little endian
+#   metadata UTF-8 JSON: model kind, scalar parameters and the offset, shape and dtype of every array
+#   arrays   little endian float64 data, each one aligned to ALIGNMENT bytes from the start of the file
+MAGIC = b'INTPMODL'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sII')
+ALIGNMENT = 64
+DTYPE = '<f8'
+
+def _model_state(model):
+    """
+    Split a fitted model into its kind, scalar parameters and arrays.
+    """
+    if isinstance(model, NewtonInterpolation):
+        return 'newton', {}, {'x_values': model.x_values, 'y_values': model.y_values, 'coefficients': model.coefficients}
+    if isinstance(model, CubicSplineInterpolation):
+        return 'cubic_spline', {'boundary': model.boundary}, {'x_values': model.x_values, 'y_values': model.y_values, 'w_values': model.w_values}
+    if isinstance(model, BarycentricInterpolation):
+        return 'barycentric', {}, {'x_values': model.x_values, 'y_values': model.y_values, 'weights': model.weights}
+    if isinstance(model, LeastSquares):
+        if model.model is None:
+            raise ValueError("No model has been fitted yet")
+        params = {'model': model.model, 'degree': model.degree, 'series_shape': list(model.series_shape)}
+        return 'least_squares', params, {'c_vector': model.c_vector}
+    raise TypeError(f"Can not save a {type(model).__name__}")
+
+def _build_model(kind, params, arrays):
+    """
+    Create a fitted model from its kind, scalar parameters and arrays, without refitting.
+    """
+    if kind == 'newton':
+        return NewtonInterpolation(arrays['x_values'], arrays['y_values'], coefficients=arrays['coefficients'])
+    if kind == 'cubic_spline':
+        return CubicSplineInterpolation(arrays['x_values'], arrays['y_values'], w_values=arrays['w_values'],
+                                        boundary=params.get('boundary', 'natural'))
+    if kind == 'barycentric':
+        return BarycentricInterpolation(arrays['x_values'], arrays['y_values'], weights=arrays['weights'])
+    if kind == 'least_squares':
+        return LeastSquares.from_coefficients(params['model'], arrays['c_vector'], params['degree'], tuple(params['series_shape']))
+    raise ValueError(f"Unknown model kind '{kind}'")
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def save_model(model, path):
+    """
+    Save a fitted model (Newton, barycentric, cubic spline or any LeastSquares model) to a compact binary file.
+    Args:
+        model: fitted model
+        path (str): file path
+    """
+    kind, params, arrays = _model_state(model)
+    arrays = {name: np.ascontiguousarray(values, dtype=DTYPE) for name, values in arrays.items()}
+
+    # The array offsets depend on the metadata length, so lay them out after a metadata size estimate and retry if needed
+    metadata_size = 256
+    while True:
+        offset = _aligned(HEADER.size + metadata_size)
+        layout = dict()
+        for name, values in arrays.items():
+            layout[name] = {'offset': offset, 'shape': list(values.shape), 'dtype': DTYPE}
+            offset = _aligned(offset + values.nbytes)
+        metadata = json.dumps({'kind': kind, 'params': params, 'arrays': layout}).encode('utf-8')
+        if len(metadata) <= metadata_size:
+            break
+        metadata_size = len(metadata)
+
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(metadata)))
+        file.write(metadata)
+        for name, values in arrays.items():
+            file.seek(layout[name]['offset'])
+            file.write(values.tobytes())
+        file.truncate(offset)
+
+def load_model(path, mmap=True):
+    """
+    Load a model saved with save_model.
+    Args:
+        path (str): file path
+        mmap (bool, optional): map the arrays read-only from the file without copying them, so the pages are shared
+            between every process loading the same file. Defaults to True.
+    Returns:
+        The fitted model, ready to be evaluated.
+    """
+    with open(path, 'rb') as file:
+        magic, version, metadata_length = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a saved interpolation model")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {version}, only versions up to {FORMAT_VERSION} are supported")
+        metadata = json.loads(file.read(metadata_length).decode('utf-8'))
+
+    if mmap:
+        buffer = np.memmap(path, mode='r', dtype=np.uint8)
+    else:
+        buffer = np.fromfile(path, dtype=np.uint8)
+
+    arrays = dict()
+    for name, layout in metadata['arrays'].items():
+        dtype = np.dtype(layout['dtype'])
+        size = int(np.prod(layout['shape'])) * dtype.itemsize
+        arrays[name] = buffer[layout['offset']:layout['offset'] + size].view(dtype).reshape(layout['shape'])
+    return _build_model(metadata['kind'], metadata['params'], arrays)
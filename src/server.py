@@ -0,0 +1,355 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from batch_fitting import fit_model, METHODS
+from least_squares import MODELS
+
+# Protocol: newline delimited JSON over a TCP or Unix socket, one object per request and per response.
+#   {"id": 1, "op": "fit", "model": "temperature", "method": "spline", "x": [...], "y": [...], "options": {...}}
+#   {"id": 2, "op": "evaluate", "model": "temperature", "x": [...]}
+#   {"id": 3, "op": "derivative", "model": "temperature", "x": [...], "order": 1}
+#   {"id": 4, "op": "integrate", "model": "temperature", "a": [...], "b": [...]}
+#   {"id": 5, "op": "drop", "model": "temperature"} and {"id": 6, "op": "list"}
+# Responses carry the request id, "ok" and either the result or "error". They may come back out of order.
+OPERATIONS = ('fit', 'evaluate', 'derivative', 'integrate', 'drop', 'list')
+LINE_LIMIT = 64 * 2**20 # Longest accepted request line in bytes
+
+class ServiceError(Exception):
+    """Request error reported to the client, the connection stays open."""
+
+class _Coalescer:
+    def __init__(self, server, name, order):
+        """
+        Gather the concurrent evaluate (order 0) or derivative requests on one model into a single vectorized call.
+        Args:
+            server (InterpolationServer): owning server
+            name (str): model name
+            order (int): derivative order, 0 to evaluate the model
+        """
+        self.server = server
+        self.name = name
+        self.order = order
+        self.pending = list() # (queries, future) waiting for the next flush
+        self.scheduled = False
+
+    def submit(self, queries):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((queries, future))
+        if not self.scheduled:
+            self.scheduled = True
+            asyncio.get_running_loop().call_later(self.server.coalesce_delay, self.flush)
+        return future
+
+    def flush(self):
+        batch, self.pending, self.scheduled = self.pending, list(), False
+        asyncio.ensure_future(self.run(batch))
+
+    async def run(self, batch):
+        lengths = [len(queries) for queries, _ in batch]
+        try:
+            model = self.server.get_model(self.name)
+            queries = np.concatenate([queries for queries, _ in batch])
+            if self.order == 0:
+                function = model.evaluate_for_x
+            elif hasattr(model, 'derivative'):
+                function = lambda values: model.derivative(values, self.order)
+            else:
+                raise ServiceError(f"Model '{self.name}' has no derivative")
+            # Large batches run on a thread, NumPy releases the GIL
+            values = await asyncio.get_running_loop().run_in_executor(self.server.evaluate_executor, function, queries)
+        except Exception as error:
+            if len(batch) > 1:
+                # Evaluate the requests one by one, so only those that fail on their own report an error
+                for request in batch:
+                    await self.run([request])
+                return
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        self.server.stats['batches'] += 1
+        self.server.stats['coalesced'] += len(batch)
+        for (_, future), chunk in zip(batch, np.split(values, np.cumsum(lengths)[:-1])):
+            if not future.done():
+                future.set_result(chunk)
+
+class InterpolationServer:
+    def __init__(self, max_workers=None, max_inflight=64, max_pending_fits=32, max_points=10_000_000, coalesce_delay=0.0):
+        """
+        Serve fitted models from memory to many clients.
+        Args:
+            max_workers (int, optional): fit processes. Defaults to the number of CPUs.
+            max_inflight (int, optional): requests of one connection being processed at once, the connection
+                is no longer read beyond it. Defaults to 64.
+            max_pending_fits (int, optional): fits queued or running at once, further fits are rejected. Defaults to 32.
+            max_points (int, optional): largest number of points or query points of a request. Defaults to 10^7.
+            coalesce_delay (float, optional): seconds to wait for more evaluate requests before a batch runs.
+                Defaults to 0, the requests received in the same event loop iteration are batched.
+        """
+        self.models = dict()
+        self.coalescers = dict()
+        self.fit_executor = ProcessPoolExecutor(max_workers=max_workers)
+        self.evaluate_executor = ThreadPoolExecutor()
+        self.max_inflight = max_inflight
+        self.max_pending_fits = max_pending_fits
+        self.max_points = max_points
+        self.coalesce_delay = coalesce_delay
+        self.pending_fits = 0
+        self.stats = {'requests': 0, 'batches': 0, 'coalesced': 0, 'rejected': 0}
+
+    def get_model(self, name):
+        model = self.models.get(name)
+        if model is None:
+            raise ServiceError(f"Unknown model '{name}'")
+        return model
+
+    def _points(self, request, key):
+        values = np.asarray(request.get(key, []), dtype=np.float64)
+        if values.ndim == 0:
+            values = values.reshape(1)
+        if values.ndim != 1:
+            # Rejected before joining a batch, a bad shape must not fail the other requests of the batch
+            raise ServiceError(f"'{key}' must be a number or a flat list of numbers")
+        if len(values) > self.max_points:
+            raise ServiceError(f"'{key}' has {len(values)} points, the limit is {self.max_points}")
+        return values
+
+    async def fit(self, request):
+        method = request.get('method', 'spline')
+        if method not in METHODS:
+            raise ServiceError(f"Unknown method '{method}', expected one of {METHODS}")
+        options = request.get('options')
+        if options is not None and not isinstance(options, dict):
+            raise ServiceError("'options' must be a JSON object")
+        if method == 'least_squares' and (options or {}).get('model', 'polynomial') not in MODELS:
+            raise ServiceError(f"Unknown model '{options['model']}', expected one of {MODELS}")
+        if self.pending_fits >= self.max_pending_fits:
+            self.stats['rejected'] += 1
+            raise ServiceError("Too many pending fits, retry later")
+        x_values = self._points(request, 'x')
+        y_values = self._points(request, 'y')
+        self.pending_fits += 1
+        try:
+            model = await asyncio.get_running_loop().run_in_executor(
+                self.fit_executor, fit_model, method, x_values, y_values, options)
+        finally:
+            self.pending_fits -= 1
+        self.models[request['model']] = model
+        return {'model': request['model']}
+
+    async def handle(self, request):
+        """
+        Process one decoded request.
+        Returns:
+            dict: the result fields of the response
+        """
+        op = request.get('op')
+        if op not in OPERATIONS:
+            raise ServiceError(f"Unknown operation '{op}', expected one of {OPERATIONS}")
+        if op == 'list':
+            return {'models': sorted(self.models), 'stats': self.stats}
+        if 'model' not in request:
+            raise ServiceError("Missing 'model'")
+        name = request['model']
+        if op == 'fit':
+            return await self.fit(request)
+        if op == 'drop':
+            self.get_model(name)
+            del self.models[name]
+            self.coalescers = {key: value for key, value in self.coalescers.items() if key[0] != name}
+            return {'model': name}
+        if op == 'integrate':
+            model = self.get_model(name)
+            if not hasattr(model, 'integrate'):
+                raise ServiceError(f"Model '{name}' has no integral")
+            a, b = self._points(request, 'a'), self._points(request, 'b')
+            # Off the event loop like evaluate, a large request must not block the other connections
+            values = await asyncio.get_running_loop().run_in_executor(self.evaluate_executor, model.integrate, a, b)
+            return {'values': np.asarray(values).tolist()}
+
+        self.get_model(name)
+        order = int(request.get('order', 1)) if op == 'derivative' else 0
+        coalescer = self.coalescers.get((name, order))
+        if coalescer is None:
+            coalescer = self.coalescers[(name, order)] = _Coalescer(self, name, order)
+        values = await coalescer.submit(self._points(request, 'x'))
+        return {'values': values.tolist()}
+
+    async def respond(self, line, writer, inflight):
+        """
+        Process one request line and write its response.
+        """
+        request_id = None
+        try:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ServiceError("A request must be a JSON object")
+                request_id = request.get('id')
+                response = {'id': request_id, 'ok': True}
+                response.update(await self.handle(request))
+            except (ServiceError, ValueError, TypeError, KeyError, ArithmeticError, np.linalg.LinAlgError) as error:
+                response = {'id': request_id, 'ok': False, 'error': str(error)}
+            except Exception as error: # Any failure, e.g. a fit on too few points, is reported to the client
+                response = {'id': request_id, 'ok': False, 'error': f"{type(error).__name__}: {error}"}
+            if not writer.is_closing():
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain() # Slow readers hold their own requests back
+        finally:
+            inflight.release() # Always free the slot, even when the response can not be written
+
+    async def connection(self, reader, writer):
+        """
+        Serve one client connection until it closes.
+        """
+        inflight = asyncio.Semaphore(self.max_inflight)
+        tasks = set()
+        try:
+            while True:
+                await inflight.acquire() # Stop reading the socket while the connection is at its limit
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    writer.write(json.dumps({'id': None, 'ok': False, 'error': "Request line too long"}).encode('utf-8') + b'\n')
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    inflight.release()
+                    continue
+                self.stats['requests'] += 1
+                task = asyncio.ensure_future(self.respond(line, writer, inflight))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve_tcp(self, host='127.0.0.1', port=8765):
+        """
+        Serve on a TCP socket until cancelled.
+        """
+        server = await asyncio.start_server(self.connection, host, port, limit=LINE_LIMIT)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_unix(self, path):
+        """
+        Serve on a Unix socket until cancelled.
+        """
+        server = await asyncio.start_unix_server(self.connection, path, limit=LINE_LIMIT)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.fit_executor.shutdown()
+        self.evaluate_executor.shutdown()
+
+async def _open(address):
+    if address.startswith('unix:'):
+        return await asyncio.open_unix_connection(address[5:], limit=LINE_LIMIT)
+    host, port = address.rsplit(':', 1)
+    return await asyncio.open_connection(host, int(port), limit=LINE_LIMIT)
+
+async def bench_client(address, requests=10_000, concurrency=32, points=16, window=8):
+    """
+    Load generator: fit a spline, then send evaluate requests over concurrent connections and measure
+    the throughput and latency.
+    Args:
+        address (str): 'host:port' or 'unix:/path/to/socket'
+        requests (int, optional): evaluate requests in total. Defaults to 10000.
+        concurrency (int, optional): connections. Defaults to 32.
+        points (int, optional): query points per request. Defaults to 16.
+        window (int, optional): requests sent ahead of their responses on each connection. Defaults to 8.
+    Returns:
+        dict: requests per second and latency percentiles in milliseconds
+    """
+    reader, writer = await _open(address)
+    x_values = np.linspace(0, 10, 1000)
+    writer.write(json.dumps({'id': 0, 'op': 'fit', 'model': 'bench', 'method': 'spline',
+                             'x': x_values.tolist(), 'y': np.sin(x_values).tolist()}).encode('utf-8') + b'\n')
+    await writer.drain()
+    response = json.loads(await reader.readline())
+    writer.close()
+    if not response['ok']:
+        raise RuntimeError(response['error'])
+
+    latencies = list()
+    rng = np.random.default_rng(0)
+
+    async def worker(count):
+        reader, writer = await _open(address)
+        sent = dict()
+        slots = asyncio.Semaphore(window)
+
+        async def receive():
+            for _ in range(count):
+                response = json.loads(await reader.readline())
+                latencies.append(time.perf_counter() - sent.pop(response['id']))
+                if not response['ok']:
+                    raise RuntimeError(response['error'])
+                slots.release()
+
+        receiving = asyncio.ensure_future(receive())
+        for request_id in range(count):
+            await slots.acquire()
+            sent[request_id] = time.perf_counter()
+            writer.write(json.dumps({'id': request_id, 'op': 'evaluate', 'model': 'bench',
+                                     'x': rng.uniform(0, 10, points).tolist()}).encode('utf-8') + b'\n')
+            await writer.drain()
+        await receiving
+        writer.close()
+
+    start = time.perf_counter()
+    counts = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    await asyncio.gather(*(worker(count) for count in counts if count))
+    elapsed = time.perf_counter() - start
+    milliseconds = np.array(latencies) * 1e3
+    return {'requests_per_second': requests / elapsed, 'p50_ms': float(np.percentile(milliseconds, 50)),
+            'p99_ms': float(np.percentile(milliseconds, 99)), 'max_ms': float(milliseconds.max())}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Interpolation service over a local TCP or Unix socket.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve = subparsers.add_parser('serve', help="run the server")
+    serve.add_argument('address', help="'host:port' or 'unix:/path/to/socket'")
+    serve.add_argument('--workers', type=int, help="fit processes (default: number of CPUs)")
+    serve.add_argument('--max-inflight', type=int, default=64, help="requests processed at once per connection (default 64)")
+    serve.add_argument('--max-pending-fits', type=int, default=32, help="fits queued at once before rejecting (default 32)")
+    serve.add_argument('--max-points', type=int, default=10_000_000, help="points per request (default 10^7)")
+    serve.add_argument('--coalesce-delay', type=float, default=0.0, help="seconds to wait to batch evaluate requests (default 0)")
+    bench = subparsers.add_parser('bench', help="load generator against a running server")
+    bench.add_argument('address', help="'host:port' or 'unix:/path/to/socket'")
+    bench.add_argument('--requests', type=int, default=10_000, help="evaluate requests in total (default 10000)")
+    bench.add_argument('--concurrency', type=int, default=32, help="connections (default 32)")
+    bench.add_argument('--points', type=int, default=16, help="query points per request (default 16)")
+    bench.add_argument('--window', type=int, default=8, help="requests in flight per connection (default 8)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        print(json.dumps(asyncio.run(bench_client(args.address, args.requests, args.concurrency, args.points, args.window))))
+        return 0
+
+    server = InterpolationServer(args.workers, args.max_inflight, args.max_pending_fits, args.max_points, args.coalesce_delay)
+    if args.address.startswith('unix:'):
+        serving = server.serve_unix(args.address[5:])
+    else:
+        host, port = args.address.rsplit(':', 1)
+        serving = server.serve_tcp(host, int(port))
+    try:
+        asyncio.run(serving)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
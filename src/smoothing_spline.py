@@ -0,0 +1,198 @@
+import numpy as np
+from math import comb
+from cubic_splines import CubicSplineInterpolation
+from streaming_least_squares import array_chunks
+import utils.matrix_operations as mat
+import utils.instrumentation as instr
+
+MAX_AUTO_SEGMENTS = 100 # Knot intervals chosen automatically, the smoothing parameter controls the fit beyond that
+GCV_GRID = 10.0 ** np.arange(-8, 8.5, 0.5) # Candidate smoothing parameters, relative to the data/penalty scale
+
+def bspline_basis(x_values, start, spacing, n_segments):
+    """
+    Nonzero uniform cubic B-spline basis values of each point: point x in knot interval j only depends
+    on the coefficients a_j ... a_j+3.
+    Args:
+        x_values (ndarray): points within [start, start + n_segments * spacing]
+        start (float): first knot
+        spacing (float): knot spacing h
+        n_segments (int): number of knot intervals
+    Returns:
+        tuple: (interval index j of each point, (n, 4) basis values)
+    """
+    position = (x_values - start) / spacing
+    j = np.clip(np.floor(position).astype(np.intp), 0, n_segments - 1)
+    t = position - j
+    t2 = t * t
+    t3 = t2 * t
+    values = np.empty((len(x_values), 4))
+    values[:, 0] = (1 - t)**3 / 6
+    values[:, 1] = (3 * t3 - 6 * t2 + 4) / 6
+    values[:, 2] = (-3 * t3 + 3 * t2 + 3 * t + 1) / 6
+    values[:, 3] = t3 / 6
+    return j, values
+
+def difference_penalty(n_coefficients, order=2):
+    """
+    Band of D^TD for the difference matrix D of the given order, which penalizes the roughness of the coefficients.
+    Returns:
+        ndarray: (order+1, n_coefficients) band with band[d, j] = (D^TD)[j, j+d]
+    """
+    row = np.array([(-1.0)**(order - k) * comb(order, k) for k in range(order + 1)])
+    rows = n_coefficients - order
+    band, _ = mat.banded_normal_equations(np.arange(rows), np.tile(row, (rows, 1)), np.zeros(rows), n_coefficients)
+    return band
+
+def _quadratic_form(band, coefficients):
+    """
+    a^T M a of a symmetric banded matrix M for each series, without forming M.
+    """
+    a = coefficients
+    total = np.sum(mat.as_column(band[0], a.ndim) * a * a, axis=0)
+    for d in range(1, len(band)):
+        total = total + 2 * np.sum(mat.as_column(band[d, :len(a) - d], a.ndim) * a[:-d] * a[d:], axis=0)
+    return total
+
+class SmoothingSpline:
+    def __init__(self, x_points, y_points, n_segments=None, smoothing=None, penalty_order=2, chunk_size=1_000_000):
+        """
+        Fit a penalized regression spline (P-spline) to noisy data: a cubic B-spline on uniform knots whose
+        coefficients a minimize |y - Ba|^2 + smoothing * |Da|^2, with D the differences of the given order.
+        The normal equations (B^TB + smoothing D^TD) a = B^Ty are banded, accumulated chunk by chunk and solved
+        in O(n_segments), so the model size only depends on the number of knots, not on the data size.
+        Args:
+            x_points (list/array): x coordinates, e.g. memory-mapped
+            y_points (list/array): y coordinates, or a 2D array of shape (n_points, n_series)
+            n_segments (int, optional): number of knot intervals. Defaults to n_points/4, at most MAX_AUTO_SEGMENTS.
+            smoothing (float, optional): smoothing parameter, 0 for a plain least squares spline.
+                Defaults to None, chosen by generalized cross validation.
+            penalty_order (int, optional): order of the coefficient differences penalized. Defaults to 2.
+            chunk_size (int, optional): number of points per chunk while forming the normal equations. Defaults to 10^6.
+        """
+        n_points = len(x_points)
+        if n_points < 2:
+            raise ValueError("At least 2 points are needed")
+        if n_segments is None:
+            n_segments = int(min(MAX_AUTO_SEGMENTS, max(1, n_points // 4)))
+        self.n_segments = n_segments
+        self.n_coefficients = n_segments + 3
+        if penalty_order >= self.n_coefficients:
+            raise ValueError(f"The penalty order must be lower than the number of coefficients {self.n_coefficients}")
+        self.penalty_order = penalty_order
+
+        self.start = float(np.min(x_points))
+        self.end = float(np.max(x_points))
+        self.spacing = (self.end - self.start) / n_segments
+
+        # Sufficient statistics B^TB, B^Ty and y^Ty
+        with instr.stage('smoothing_spline.normal_equations', n_points):
+            self.series_shape = np.shape(y_points)[1:]
+            self.BtB = np.zeros((4, self.n_coefficients))
+            self.Bty = np.zeros((self.n_coefficients,) + self.series_shape)
+            self.yty = np.zeros(self.series_shape)
+            for x_chunk, y_chunk in array_chunks(x_points, y_points, chunk_size):
+                x_chunk = np.asarray(x_chunk, dtype=np.float64)
+                y_chunk = np.asarray(y_chunk, dtype=np.float64)
+                columns, values = bspline_basis(x_chunk, self.start, self.spacing, n_segments)
+                band, b_norm = mat.banded_normal_equations(columns, values, y_chunk, self.n_coefficients)
+                self.BtB += band
+                self.Bty += b_norm
+                self.yty += np.sum(y_chunk**2, axis=0)
+        self.count = n_points
+        self.penalty = difference_penalty(self.n_coefficients, penalty_order)
+
+        self.gcv = None # Generalized cross validation score of the chosen smoothing parameter
+        if smoothing is None:
+            smoothing = self.choose_smoothing()
+        self.smoothing = smoothing
+        self.coefficients = self.solve(smoothing)
+
+    def system(self, smoothing):
+        """
+        Band of B^TB + smoothing D^TD.
+        """
+        band = np.zeros((max(len(self.BtB), len(self.penalty)), self.n_coefficients))
+        band[:len(self.BtB)] += self.BtB
+        band[:len(self.penalty)] += smoothing * self.penalty
+        return band
+
+    def solve(self, smoothing):
+        """
+        Solve the banded normal equations for the B-spline coefficients.
+        Returns:
+            ndarray: coefficients a_0 ... a_n_segments+2, followed by the series axis for several series
+        """
+        with instr.stage('smoothing_spline.solve', self.n_coefficients):
+            return mat.solve_banded_spd(self.system(smoothing), self.Bty)
+
+    def choose_smoothing(self):
+        """
+        Choose the smoothing parameter minimizing the generalized cross validation score
+        GCV = n RSS / (n - tr(H))^2, where tr(H) = tr((B^TB + smoothing D^TD)^-1 B^TB) is the effective number
+        of parameters. The residual sum of squares is computed from the sufficient statistics only, and the trace
+        from the band of the inverse, so each candidate costs O(n_segments) like a solve.
+        Returns:
+            float: the smoothing parameter, its score is stored in self.gcv
+        """
+        scale = self.BtB[0].sum() / self.penalty[0].sum() # Makes the grid independent of the data scale
+        best = None
+        with instr.stage('smoothing_spline.gcv', self.n_coefficients):
+            for relative in GCV_GRID:
+                smoothing = relative * scale
+                try:
+                    U = mat.cholesky_banded(self.system(smoothing))
+                except np.linalg.LinAlgError:
+                    continue
+                coefficients = mat.solve_cholesky_banded(U, self.Bty)
+                # tr(A^-1 B^TB) only needs A^-1 within the band of B^TB, the off diagonals count twice by symmetry
+                inverse = mat.banded_inverse(U)[:len(self.BtB)]
+                trace = np.sum(inverse[0] * self.BtB[0]) + 2 * np.sum(inverse[1:] * self.BtB[1:])
+                rss = np.sum(self.yty - 2 * np.sum(coefficients * self.Bty, axis=0) +
+                             _quadratic_form(self.BtB, coefficients))
+                if self.count <= trace:
+                    continue
+                score = self.count * max(rss, 0) / (self.count - trace)**2
+                if best is None or score < best[0]:
+                    best = (score, smoothing)
+        if best is None:
+            raise np.linalg.LinAlgError("No smoothing parameter gives a solvable system")
+        self.gcv = best[0]
+        return best[1]
+
+    def evaluate_for_x(self, value):
+        """
+        Evaluate the smoothing spline at a given point x or an array of points, in O(1) per point as the knots are uniform.
+        Points outside [x_min, x_max] evaluate to nan.
+        Args:
+            value (float/array): query point(s)
+        Returns:
+            float/ndarray: spline value(s) with the same shape as value, followed by the series axis for several series
+        """
+        values = np.asarray(value, dtype=np.float64)
+        flat = values.reshape(-1)
+        with instr.stage('smoothing_spline.evaluate', flat.size):
+            columns, basis = bspline_basis(flat, self.start, self.spacing, self.n_segments)
+            result = sum(mat.as_column(basis[:, p], self.coefficients.ndim) * self.coefficients[columns + p] for p in range(4))
+            outside = (flat < self.start) | (flat > self.end) | np.isnan(flat)
+            result[outside] = np.nan
+        result = result.reshape(values.shape + self.series_shape)
+        return result[()] if result.ndim == 0 else result
+
+    def to_cubic_spline(self):
+        """
+        Convert to the equivalent CubicSplineInterpolation on the knots, with the values y_k = (a_k + 4a_k+1 + a_k+2)/6
+        and the weights (second derivatives) w_k = (a_k - 2a_k+1 + a_k+2)/h^2, e.g. to save it, resample with it or use
+        its derivative, integrate and symbolic output.
+        Returns:
+            CubicSplineInterpolation: the same spline, with n_segments + 1 knots
+        """
+        a = self.coefficients
+        knots = self.start + self.spacing * np.arange(self.n_segments + 1)
+        knots[-1] = self.end
+        y_values = (a[:-2] + 4 * a[1:-1] + a[2:]) / 6
+        w_values = (a[:-2] - 2 * a[1:-1] + a[2:]) / self.spacing**2
+        return CubicSplineInterpolation(knots, y_values, w_values=w_values)
+
+    def plot(self, num_points=100, path=None):
+        """Plot the equivalent cubic spline on the knots, saved to path if given."""
+        return self.to_cubic_spline().plot(num_points, path)
@@ -0,0 +1,107 @@
+import numpy as np
+from least_squares import LeastSquares, MODELS, model_system
+
+def array_chunks(x_values, y_values, chunk_size=1_000_000):
+    """
+    Iterate over (x, y) chunks of arrays without copying them, e.g. memory-mapped arrays from np.load(mmap_mode='r').
+    Args:
+        x_values (ndarray): x values
+        y_values (ndarray): y values, or a 2D array of shape (n_points, n_series)
+        chunk_size (int, optional): number of points per chunk. Defaults to 1_000_000.
+    Yields:
+        tuple: (x chunk, y chunk)
+    """
+    for start in range(0, len(x_values), chunk_size):
+        yield x_values[start:start + chunk_size], y_values[start:start + chunk_size]
+
+class StreamingLeastSquares:
+    def __init__(self, model='polynomial', degree=1):
+        """
+        Fit a LeastSquares model chunk by chunk without keeping the data in memory, by accumulating
+        the normal equations sufficient statistics A^T A and A^T b of the linearized system.
+        Args:
+            model (str, optional): one of least_squares.MODELS. Defaults to 'polynomial'.
+            degree (int, optional): degree of the polynomial model. Defaults to 1.
+        """
+        if model not in MODELS:
+            raise ValueError(f"Unknown model '{model}', expected one of {MODELS}")
+        self.model = model
+        self.degree = degree if model == 'polynomial' else 1
+
+        self.A_norm = None # Sum of A^T A over the chunks
+        self.b_norm = None # Sum of A^T b over the chunks
+        self.series_shape = None # Shape of the series axis, () for a single series
+        self.count = 0 # Number of points seen
+
+    def partial_fit(self, x_values, y_values):
+        """
+        Add a chunk of points to the accumulated normal equations.
+        Args:
+            x_values (array): x values of the chunk
+            y_values (array): y values of the chunk, or a 2D array of shape (n_points, n_series)
+        Returns:
+            StreamingLeastSquares: self
+        """
+        x_values = np.asarray(x_values, dtype=np.float64)
+        y_values = np.asarray(y_values, dtype=np.float64)
+        if self.series_shape is None:
+            self.series_shape = y_values.shape[1:]
+        elif y_values.shape[1:] != self.series_shape:
+            raise ValueError(f"Chunk has series shape {y_values.shape[1:]}, expected {self.series_shape}")
+
+        A_matrix, b_vector = model_system(self.model, x_values, y_values, self.degree)
+        A_norm = A_matrix.T @ A_matrix
+        b_norm = A_matrix.T @ b_vector
+        if self.A_norm is None:
+            self.A_norm, self.b_norm = A_norm, b_norm
+        else:
+            self.A_norm += A_norm
+            self.b_norm += b_norm
+        self.count += len(x_values)
+        return self
+
+    def fit(self, chunks):
+        """
+        Add every (x, y) chunk of an iterable, e.g. a generator reading a file or array_chunks over memory-mapped arrays.
+        Args:
+            chunks (iterable): (x values, y values) pairs
+        Returns:
+            StreamingLeastSquares: self
+        """
+        for x_values, y_values in chunks:
+            self.partial_fit(x_values, y_values)
+        return self
+
+    def merge(self, other):
+        """
+        Merge the statistics accumulated by another StreamingLeastSquares of the same model, e.g. from another worker.
+        Args:
+            other (StreamingLeastSquares): accumulated statistics to add
+        Returns:
+            StreamingLeastSquares: self
+        """
+        if (other.model, other.degree) != (self.model, self.degree):
+            raise ValueError("Can only merge fits of the same model and degree")
+        if other.A_norm is None:
+            return self
+        if self.A_norm is None:
+            self.A_norm, self.b_norm = other.A_norm.copy(), other.b_norm.copy()
+            self.series_shape = other.series_shape
+        else:
+            if other.series_shape != self.series_shape:
+                raise ValueError("Can only merge fits with the same number of series")
+            self.A_norm += other.A_norm
+            self.b_norm += other.b_norm
+        self.count += other.count
+        return self
+
+    def solve(self):
+        """
+        Solve the accumulated normal equations, which can be done at any time between chunks.
+        Returns:
+            LeastSquares: the fitted model, which can be evaluated like a regular LeastSquares fit
+        """
+        if self.A_norm is None:
+            raise ValueError("No data has been added yet")
+        c_vector = np.linalg.solve(self.A_norm, self.b_norm)
+        return LeastSquares.from_coefficients(self.model, c_vector, self.degree, self.series_shape)
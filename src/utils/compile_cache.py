@@ -0,0 +1,105 @@
+from collections import OrderedDict
+import numpy as np
+from utils.lazy_import import lazy_import
+
+sp = lazy_import('sympy')
+
+class CompileCache:
+    def __init__(self, maxsize=128):
+        """
+        LRU cache of sympy expressions compiled with lambdify to vectorized NumPy functions.
+        Expressions are keyed on their structure, so equal expressions share one compiled function.
+        Args:
+            maxsize (int, optional): maximum number of compiled functions kept. Defaults to 128.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._functions = OrderedDict()
+
+    def compile(self, expression, symbol='x'):
+        """
+        Get the compiled NumPy function of an expression, compiling it on the first request.
+        Args:
+            expression (sympy.Expr): expression of one variable
+            symbol (str/sympy.Symbol, optional): variable of the expression. Defaults to 'x'.
+        Returns:
+            callable: function taking a float or an array and returning values of the same shape
+        """
+        symbol = sp.Symbol(symbol) if isinstance(symbol, str) else symbol
+        key = (expression, symbol)
+        function = self._functions.get(key)
+        if function is not None:
+            self.hits += 1
+            self._functions.move_to_end(key)
+            return function
+
+        self.misses += 1
+        compiled = sp.lambdify(symbol, expression, 'numpy')
+
+        def function(values):
+            result = compiled(values)
+            # Constant expressions return a scalar, broadcast it to the shape of the input
+            if np.shape(result) != np.shape(values):
+                result = np.full(np.shape(values), result, dtype=np.float64)
+            return result
+
+        self._functions[key] = function
+        while len(self._functions) > self.maxsize:
+            self._functions.popitem(last=False)
+        return function
+
+    def info(self):
+        """
+        Returns:
+            dict: hits, misses, current size and maximum size of the cache
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._functions), 'maxsize': self.maxsize}
+
+    def resize(self, maxsize):
+        """
+        Change the maximum number of compiled functions kept, evicting the least recently used ones if needed.
+        """
+        self.maxsize = maxsize
+        while len(self._functions) > self.maxsize:
+            self._functions.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove every compiled function and reset the counters.
+        """
+        self._functions.clear()
+        self.hits = 0
+        self.misses = 0
+
+_cache = CompileCache()
+
+def compile_expression(expression, symbol='x'):
+    """
+    Get the compiled NumPy function of a sympy expression from the shared cache.
+    """
+    return _cache.compile(expression, symbol)
+
+def evaluate_expression(expression, values, symbol='x'):
+    """
+    Evaluate a sympy expression at a float or an array of points through the shared cache.
+    """
+    return compile_expression(expression, symbol)(np.asarray(values, dtype=np.float64))
+
+def cache_info():
+    """
+    Hit and miss counters and size of the shared cache.
+    """
+    return _cache.info()
+
+def set_cache_size(maxsize):
+    """
+    Set the maximum number of compiled functions of the shared cache.
+    """
+    _cache.resize(maxsize)
+
+def clear_cache():
+    """
+    Empty the shared cache and reset its counters.
+    """
+    _cache.clear()
@@ -0,0 +1,80 @@
+import sys
+from fractions import Fraction
+import numpy as np
+
+def _parse_csv(lines):
+    """
+    Parse comma separated lines into a 2D float array, accepting fractions such as 1/3.
+    Empty lines and lines starting with # are skipped.
+    """
+    rows = list()
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        rows.append([float(Fraction(value.strip())) for value in line.split(',')])
+    return np.array(rows, dtype=np.float64)
+
+def _read_table(path):
+    """
+    Read a 2D float array from a .npy file, a CSV file or stdin ('-').
+    """
+    if path == '-':
+        data = _parse_csv(sys.stdin)
+    elif path.endswith('.npy'):
+        data = np.load(path)
+    else:
+        try:
+            data = np.loadtxt(path, delimiter=',', ndmin=2)
+        except ValueError:
+            with open(path) as file:
+                data = _parse_csv(file)
+    return data.reshape(len(data), -1)
+
+def read_points(path):
+    """
+    Read data points in bulk from a .npy file, a CSV file or stdin ('-').
+    The first column holds the x values and every following column the y values of one series.
+    Args:
+        path (str): file path, or '-' to read CSV from stdin
+    Returns:
+        tuple: x values (ndarray) and y values (1D ndarray, or 2D of shape (n_points, n_series) for several series)
+    """
+    data = _read_table(path)
+    if data.shape[1] < 2:
+        raise ValueError(f"Expected at least two columns (x, y) in {path}")
+    y_values = data[:, 1] if data.shape[1] == 2 else data[:, 1:]
+    return data[:, 0], y_values
+
+def read_query(path=None, grid=None):
+    """
+    Read the query points to evaluate at, from a file like read_points (first column) or from a grid 'start:stop:num'.
+    Args:
+        path (str, optional): file path, or '-' to read CSV from stdin
+        grid (str, optional): evenly spaced grid as 'start:stop:num'
+    Returns:
+        ndarray: query points, or None if neither path nor grid is given
+    """
+    if grid is not None:
+        start, stop, num = grid.split(':')
+        return np.linspace(float(Fraction(start)), float(Fraction(stop)), int(num))
+    if path is None:
+        return None
+    return _read_table(path)[:, 0]
+
+def write_results(path, x_values, values):
+    """
+    Write query points and their values to a .npy file, a CSV file or stdout ('-'),
+    with the x values as first column and one column per series.
+    Args:
+        path (str): file path, or '-' to write CSV to stdout
+        x_values (ndarray): query points
+        values (ndarray): values at the query points, 1D or of shape (n_queries, n_series)
+    """
+    data = np.column_stack((x_values, values))
+    if path == '-':
+        np.savetxt(sys.stdout, data, delimiter=',')
+    elif path.endswith('.npy'):
+        np.save(path, data)
+    else:
+        np.savetxt(path, data, delimiter=',')
@@ -1,56 +1,82 @@
-def calculate_divided_differences(x_points, y_points, n=0):
+import numpy as np
+from .matrix_operations import as_column
+
+def calculate_divided_differences(x_points, y_points, n=0, diagonal_only=False):
     """
     Calculate divided differences for x and y given.
     if n is left default, function will fully calculate the divided differences (len(x_points)-1 times).
     if n is specified, function will calculate divided divided differences up to n times.
+    Each order is computed in a single vectorized step. The x values must be distinct, ValueError otherwise.
     Args:
         x_points (array-like): x coordinates
-        y_points (array-like): y coordinates
+        y_points (array-like): y coordinates, or a 2D array of shape (n_points, n_series) to calculate
+            the divided differences of several series sharing the same x values at once
         n (int, optional): number of times to calculate divided differences. Defaults to 0.
-        
+        diagonal_only (bool, optional): only keep the Newton coefficients f[x0], f[x0,x1], ... updated in place
+            in O(n) memory instead of the full table. Defaults to False.
+
     Returns:
-        list: List of lists containing divided differences in the form of [[xpoints...],[ypoints...],[f[xi,xi+1]...], ...]
+        list: List of arrays containing divided differences in the form of [[xpoints...],[ypoints...],[f[xi,xi+1]...], ...],
+        all rows being views into one preallocated 2D array.
+        If diagonal_only is set, a 1D array of the Newton coefficients instead.
     """
     if len(x_points) != len(y_points):
         return None
     if n < 0:
         return None
-    it = len(x_points) if n==0 else n #number of iterations
-    table = list()
-    table.append(x_points)
-    table.append(y_points)
-    
+    x = np.asarray(x_points, dtype=np.float64)
+    if np.any(np.diff(np.sort(x)) == 0):
+        # NumPy would only warn and fill the table with inf/nan
+        raise ValueError("The x values must be distinct to calculate divided differences")
+    length = len(x)
+    it = length if n==0 else n #number of iterations
+
+    if diagonal_only:
+        # Classic in-place update: after step k, coef[k:] holds f[x_i-k,...,x_i]
+        coef = np.array(y_points, dtype=np.float64)
+        for k in range(1, it):
+            coef[k:] = (coef[k:] - coef[k-1:-1]) / as_column(x[k:] - x[:-k], coef.ndim)
+        return coef[:it]
+
+    # Row 0 holds x, row 1 holds y and row r holds the (r-1)th order divided differences
+    y = np.asarray(y_points, dtype=np.float64)
+    table = np.zeros((it + 1, length) + y.shape[1:], dtype=np.float64)
+    table[0] = as_column(x, y.ndim)
+    table[1] = y
+
     # Calculate divided differences
     for row in range(2,it+1):
-        arr = list()
-        for col in range(len(x_points)-row+1):
-            arr.append(round((table[row-1][col+1]-table[row-1][col])/(table[0][col+row-1]-table[0][col]),4))
-        table.append(arr)
-    
-    return table
-def beautify_difftable(data):
+        size = length - row + 1
+        table[row, :size] = (table[row-1, 1:size+1] - table[row-1, :size]) / as_column(x[row-1:] - x[:size], y.ndim)
+
+    return [table[row, :length - max(row - 1, 0)] for row in range(it + 1)]
+
+def beautify_difftable(data, decimals=4):
     """
     Beautify divided differences table by transposing rows and giving it a horizontal triangular shape
     Args:
     data (list): List of lists containing divided differences
+    decimals (int, optional): number of decimals to round the displayed values to, None to keep them as is. Defaults to 4.
     Returns:
     list(list()): Beautified divided differences table
     """
+    def display(value):
+        return value if decimals is None else round(float(value), decimals)
 
     #Initialize empty 2D array with columns equal to number of data rows, and rows equal to number of data columns
-    result = [['' for _ in range(len(data))] for _ in range(len(data[0])*2 - 1)] 
+    result = [['' for _ in range(len(data))] for _ in range(len(data[0])*2 - 1)]
     next = 0
     # Fill the first two columns of the result with spaced x and y values
     for i in range(len(data[0])):
-        result[next][0] = data[0][i]
-        result[next][1] = data[1][i]
+        result[next][0] = display(data[0][i])
+        result[next][1] = display(data[1][i])
         next += 2
-        
+
     # Fill each remaining row as spaced and offset to give it a horizontal centered triangular shape
     for i in range(2, len(data)):
         next = i - 1
         for j in range(len(data[i])):
-            result[next][i] = data[i][j]
+            result[next][i] = display(data[i][j])
             next += 2
 
     return result
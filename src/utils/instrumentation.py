@@ -0,0 +1,156 @@
+import logging
+from contextlib import contextmanager
+from time import perf_counter
+
+_sinks = list() # Registered sinks, instrumentation is disabled while empty
+
+class _DisabledStage:
+    """
+    Shared no-op context manager returned while no sink is registered, so disabled instrumentation costs one check.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_DISABLED = _DisabledStage()
+
+class _Stage:
+    """
+    Context manager timing one stage and sending the measure to every registered sink.
+    """
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.start = None
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = perf_counter() - self.start
+        for sink in _sinks:
+            sink.record(self.name, seconds, self.size)
+        return False
+
+def stage(name, size=None):
+    """
+    Time a hot path stage, e.g. `with stage('spline.solve', n): ...`.
+    Args:
+        name (str): stage name, prefixed by the method name
+        size (int, optional): problem size of the stage, such as the number of points or queries
+    Returns:
+        A context manager, which does nothing if no sink is registered.
+    """
+    if not _sinks:
+        return _DISABLED
+    return _Stage(name, size)
+
+def enabled():
+    """
+    Whether any sink is registered.
+    """
+    return bool(_sinks)
+
+def add_sink(sink):
+    """
+    Register a sink receiving every stage measure through its record(name, seconds, size) method.
+    """
+    _sinks.append(sink)
+
+def remove_sink(sink):
+    """
+    Unregister a sink.
+    """
+    _sinks.remove(sink)
+
+@contextmanager
+def instrument(*sinks):
+    """
+    Register sinks for the duration of a with block.
+    Args:
+        sinks: sinks to register
+    Yields:
+        The first sink, e.g. `with instrument(MemorySink()) as metrics: ...`
+    """
+    for sink in sinks:
+        add_sink(sink)
+    try:
+        yield sinks[0] if sinks else None
+    finally:
+        for sink in sinks:
+            remove_sink(sink)
+
+class LoggingSink:
+    def __init__(self, logger=None, level=logging.DEBUG):
+        """
+        Sink logging every stage measure.
+        Args:
+            logger (logging.Logger, optional): logger to use. Defaults to the 'interpolation' logger.
+            level (int, optional): log level. Defaults to logging.DEBUG.
+        """
+        self.logger = logger or logging.getLogger('interpolation')
+        self.level = level
+
+    def record(self, name, seconds, size):
+        self.logger.log(self.level, "%s took %.6f s (size %s)", name, seconds, size)
+
+class MemorySink:
+    def __init__(self):
+        """
+        Sink aggregating the number of calls, total and maximum time and last size of every stage in memory.
+        """
+        self.stages = dict()
+
+    def record(self, name, seconds, size):
+        stats = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'size': None})
+        stats['calls'] += 1
+        stats['seconds'] += seconds
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
+        stats['size'] = size
+
+    def summary(self):
+        """
+        Returns:
+            str: one line per stage, slowest total time first
+        """
+        lines = list()
+        for name, stats in sorted(self.stages.items(), key=lambda item: -item[1]['seconds']):
+            lines.append(f"{name:32} {stats['calls']:8} calls {stats['seconds'] * 1e3:12.3f} ms total "
+                         f"{stats['max_seconds'] * 1e3:10.3f} ms max  size {stats['size']}")
+        return "\n".join(lines)
+
+    def clear(self):
+        self.stages.clear()
+
+class PrometheusTextSink(MemorySink):
+    def __init__(self, path):
+        """
+        Sink aggregating like MemorySink and writing the metrics in the Prometheus text format on dump().
+        Args:
+            path (str): file written by dump(), e.g. read by the node exporter textfile collector
+        """
+        super().__init__()
+        self.path = path
+
+    def dump(self):
+        """
+        Write the aggregated metrics to the file, replacing its content.
+        """
+        lines = ["# HELP interpolation_stage_seconds_total Total time spent in the stage.",
+                 "# TYPE interpolation_stage_seconds_total counter"]
+        lines += [f'interpolation_stage_seconds_total{{stage="{name}"}} {stats["seconds"]}' for name, stats in self.stages.items()]
+        lines += ["# HELP interpolation_stage_calls_total Number of times the stage ran.",
+                  "# TYPE interpolation_stage_calls_total counter"]
+        lines += [f'interpolation_stage_calls_total{{stage="{name}"}} {stats["calls"]}' for name, stats in self.stages.items()]
+        lines += ["# HELP interpolation_stage_max_seconds Longest run of the stage.",
+                  "# TYPE interpolation_stage_max_seconds gauge"]
+        lines += [f'interpolation_stage_max_seconds{{stage="{name}"}} {stats["max_seconds"]}' for name, stats in self.stages.items()]
+        lines += ["# HELP interpolation_stage_size Problem size of the last run of the stage.",
+                  "# TYPE interpolation_stage_size gauge"]
+        lines += [f'interpolation_stage_size{{stage="{name}"}} {stats["size"]}' for name, stats in self.stages.items()
+                  if stats['size'] is not None]
+        with open(self.path, 'w') as file:
+            file.write("\n".join(lines) + "\n")
@@ -0,0 +1,23 @@
+import importlib.util
+import sys
+
+def lazy_import(name):
+    """
+    Import a module lazily: the returned module is only executed on first attribute access,
+    so heavy optional parts such as sympy stay off the numeric paths until they are needed.
+    Args:
+        name (str): module name, e.g. 'sympy'
+    Returns:
+        module: the (not yet executed) module
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -1,52 +1,402 @@
-from numpy import ones, ndarray, dot
-from numpy.linalg import solve
+from collections import OrderedDict
+from hashlib import blake2b
+from numpy import ndarray, dot, empty, zeros, zeros_like, bincount, sqrt, asarray, ascontiguousarray, float64, finfo, cumprod, multiply, sin, cos, log, pi
+from numpy.linalg import solve, qr, svd, LinAlgError
 
-def generate_vandermonde_matrix(x_values, degree):
+SOLVER_METHODS = ('normal', 'qr', 'svd')
+FACTORIZATION_CACHE_SIZE = 16 # Number of design matrices whose factorization is kept
+_factorization_cache = OrderedDict()
+
+def as_column(values, ndim):
     """
-    Generate a Vandermonde matrix with the given x_values.
+    Reshape a 1D array so it broadcasts along the first axis of an ndim array,
+    e.g. per point values against a (n_points, n_series) array.
+    Args:
+    values (ndarray): 1D array.
+    ndim (int): number of dimensions of the array to broadcast against.
+    Returns:
+    A reshaped view (ndarray).
+    """
+    return values.reshape((-1,) + (1,) * (ndim - 1))
+
+def _output_buffer(out, shape):
+    """
+    Return the caller provided output buffer after checking its shape, or allocate a new one.
+    """
+    if out is None:
+        return empty(shape, dtype=float64)
+    if out.shape != shape:
+        raise ValueError(f"Output buffer has shape {out.shape}, expected {shape}")
+    return out
+
+def generate_vandermonde_matrix(x_values, degree, out=None):
+    """
+    Generate a Vandermonde matrix with the given x_values, with the powers built as a cumulative product.
     Args:
     x_values (list): A list of x values.
     degree (int): The degree of the polynomial.
+    out (ndarray, optional): preallocated (n, degree+1) buffer to write the matrix into.
     Returns:
     A Vandermonde matrix (ndarray).
     """
-    n = len(x_values)
-    A = ones((n,degree+1))
-
-
-    for row in range(0,n):
-        x = x_values[row]
-        for col in range(1,degree+1):
-            A[row][col] = x**col
+    x_values = asarray(x_values, dtype=float64)
+    A = _output_buffer(out, (len(x_values), degree + 1))
+    A[:, 0] = 1
+    if degree > 0:
+        A[:, 1:] = x_values[:, None]
+        cumprod(A[:, 1:], axis=1, out=A[:, 1:]) # x, x^2, x^3, ...
     return A
 
-def generate_colvector_from_function(f: callable, x_values: list) -> ndarray:
+def generate_periodic_matrix(x_values, out=None):
     """
-    Generate a column vector from a sympy expression.
+    Generate the matrix of the periodic model with rows [1, cos(2 pi x), sin(2 pi x)].
     Args:
-    f (sympy.Expr): A sympy expression.
     x_values (list): A list of x values.
+    out (ndarray, optional): preallocated (n, 3) buffer to write the matrix into.
+    Returns:
+    The periodic model matrix (ndarray).
+    """
+    x_values = asarray(x_values, dtype=float64)
+    A = _output_buffer(out, (len(x_values), 3))
+    A[:, 0] = 1
+    multiply(x_values, 2 * pi, out=A[:, 1])
+    sin(A[:, 1], out=A[:, 2])
+    cos(A[:, 1], out=A[:, 1])
+    return A
+
+def generate_colvector_from_function(f: callable, x_values: list, out=None) -> ndarray:
+    """
+    Generate a column vector by applying a function to every value at once.
+    Args:
+    f (callable): A sympy Lambda, which is compiled with lambdify, or a vectorized function such as a numpy ufunc.
+    x_values (list): A list of x values, or a 2D array to get one column per series.
+    out (ndarray, optional): preallocated buffer of shape (n, 1), or (n, n_series), to write the vector into.
+    Returns:
+    A column vector (ndarray).
+    """
+    x_values = asarray(x_values, dtype=float64)
+    shape = (len(x_values), 1) if x_values.ndim == 1 else x_values.shape
+    result = _output_buffer(out, shape)
+    if hasattr(f, 'variables') and hasattr(f, 'expr'):
+        from sympy import lambdify
+        f = lambdify(f.variables, f.expr, 'numpy')
+    result[...] = asarray(f(x_values), dtype=float64).reshape(shape)
+    return result
+
+def generate_log_colvector(y_values, x_values=None, out=None) -> ndarray:
+    """
+    Generate the column vector ln(y) of the linearized powerlaw and exponential models,
+    or ln(y) - ln(x) of the drug concentration model if x_values is given.
+    Args:
+    y_values (list): A list of y values, or a 2D array to get one column per series.
+    x_values (list, optional): A list of x values.
+    out (ndarray, optional): preallocated buffer of shape (n, 1), or (n, n_series), to write the vector into.
     Returns:
     A column vector (ndarray).
     """
-    result = ndarray((len(x_values),1))
-    for i in range(len(x_values)):
-        result[i] = f(x_values[i])
+    y_values = asarray(y_values, dtype=float64)
+    result = _output_buffer(out, (len(y_values), 1) if y_values.ndim == 1 else y_values.shape)
+    log(y_values.reshape(result.shape), out=result)
+    if x_values is not None:
+        result -= log(asarray(x_values, dtype=float64))[:, None]
     return result
 
-def solve_inconsistent_system(A_matrix, b_vector) -> ndarray:
+def normal_equations(A_matrix, b_vector):
     """
-    Solve an inconsistent system of linear equations.
+    Form the normal equations A^T A c = A^T b of an inconsistent system.
     Args:
     A_matrix (ndarray): A matrix of coefficients.
     b_vector (ndarray): A column vector of constants.
     Returns:
-    A solution vector (ndarray).
+    A^T A and A^T b (ndarray, ndarray).
     """
-    # Create the A matrix and b vector
     A_norm = dot(A_matrix.T, A_matrix) #A^T . A
     b_norm = dot(A_matrix.T, b_vector) #A^T . b
-    # Solve the normal equation
-    solution = solve(A_norm, b_norm)
-    return solution, A_norm, b_norm
-    
\ No newline at end of file
+    return A_norm, b_norm
+
+def solve_upper_triangular(R_matrix, b_vector) -> ndarray:
+    """
+    Solve R x = b by back substitution for an upper triangular R.
+    Args:
+    R_matrix (ndarray): An upper triangular matrix.
+    b_vector (ndarray): A vector or a matrix with one column per right hand side.
+    Returns:
+    A solution vector (ndarray).
+    """
+    x = asarray(b_vector, dtype=float64).copy()
+    for i in range(len(x) - 1, -1, -1):
+        x[i] = (x[i] - dot(R_matrix[i, i+1:], x[i+1:])) / R_matrix[i, i]
+    return x
+
+def solve_lower_triangular(L_matrix, b_vector) -> ndarray:
+    """
+    Solve L x = b by forward substitution for a lower triangular L.
+    Args:
+    L_matrix (ndarray): A lower triangular matrix.
+    b_vector (ndarray): A vector or a matrix with one column per right hand side.
+    Returns:
+    A solution vector (ndarray).
+    """
+    x = asarray(b_vector, dtype=float64).copy()
+    for i in range(len(x)):
+        x[i] = (x[i] - dot(L_matrix[i, :i], x[:i])) / L_matrix[i, i]
+    return x
+
+def factorize(A_matrix, method='normal', rcond=None):
+    """
+    Factorize a design matrix for solving least squares systems, reusing a cached factorization
+    if the same matrix was factorized before.
+    Args:
+    A_matrix (ndarray): A matrix of coefficients.
+    method (str): 'normal' for the normal equations matrix A^T A (solved by LU, which is robust for high degrees),
+        'qr' for a Householder QR of A, or 'svd' for a rank revealing singular value decomposition of A.
+    rcond (float, optional): relative tolerance under which singular values are treated as zero (svd only).
+    Returns:
+    The factorization (tuple).
+    """
+    if method not in SOLVER_METHODS:
+        raise ValueError(f"Unknown solver method '{method}', expected one of {SOLVER_METHODS}")
+    A_matrix = ascontiguousarray(A_matrix, dtype=float64)
+    key = (method, rcond, A_matrix.shape, blake2b(A_matrix.data, digest_size=16).digest())
+    if key in _factorization_cache:
+        _factorization_cache.move_to_end(key)
+        return _factorization_cache[key]
+
+    if method == 'normal':
+        factorization = (dot(A_matrix.T, A_matrix),)
+    elif method == 'qr':
+        factorization = qr(A_matrix, mode='reduced')
+    else:
+        U, s, Vt = svd(A_matrix, full_matrices=False)
+        tolerance = (rcond if rcond is not None else max(A_matrix.shape) * finfo(float64).eps) * s[0]
+        rank = int((s > tolerance).sum())
+        factorization = (U[:, :rank], s[:rank], Vt[:rank])
+
+    _factorization_cache[key] = factorization
+    if len(_factorization_cache) > FACTORIZATION_CACHE_SIZE:
+        _factorization_cache.popitem(last=False)
+    return factorization
+
+def clear_factorization_cache():
+    """
+    Remove every cached factorization.
+    """
+    _factorization_cache.clear()
+
+def solve_inconsistent_system(A_matrix, b_vector, method='normal', rcond=None) -> ndarray:
+    """
+    Solve an inconsistent system of linear equations in the least squares sense.
+    The factorization of A is cached, so solving again with the same A and new b vectors skips the factorization
+    (the normal method only reuses A^T A).
+    Args:
+    A_matrix (ndarray): A matrix of coefficients.
+    b_vector (ndarray): A column vector of constants, or a matrix with one column per right hand side.
+    method (str, optional): 'normal' (A^T A c = A^T b, shown in the plots), 'qr' or 'svd'. Defaults to 'normal'.
+    rcond (float, optional): relative tolerance for the rank of A (svd only).
+    Returns:
+    A solution vector (ndarray), and A^T A and A^T b for the normal method (None otherwise, see normal_equations).
+    """
+    factorization = factorize(A_matrix, method, rcond)
+    if method == 'normal':
+        # Solve the normal equation A^T A c = A^T b by LU, a Cholesky factor fails when A^T A is numerically indefinite
+        A_norm, = factorization
+        b_norm = dot(A_matrix.T, b_vector) #A^T . b
+        return solve(A_norm, b_norm), A_norm, b_norm
+    if method == 'qr':
+        Q, R = factorization
+        return solve_upper_triangular(R, dot(Q.T, b_vector)), None, None
+
+    U, s, Vt = factorization
+    projection = dot(U.T, b_vector)
+    return dot(Vt.T, projection / s.reshape((-1,) + (1,) * (projection.ndim - 1))), None, None
+
+def solve_tridiagonal(lower, diagonal, upper, rhs) -> ndarray:
+    """
+    Solve a tridiagonal system of linear equations with the Thomas algorithm in O(n).
+    Only the three diagonals are stored, the full matrix is never built.
+    Args:
+    lower (ndarray): sub-diagonal, length n-1.
+    diagonal (ndarray): main diagonal, length n.
+    upper (ndarray): super-diagonal, length n-1.
+    rhs (ndarray): right hand side, length n, or (n, k) to solve k systems sharing the same factorization.
+    Returns:
+    A solution vector (ndarray).
+    """
+    diagonal = asarray(diagonal, dtype=float64)
+    n = len(diagonal)
+    c = empty(n, dtype=float64) # Modified super-diagonal
+    d = asarray(rhs, dtype=float64).copy() # Modified right hand side
+    if n == 0:
+        return d
+
+    # Forward elimination
+    pivot = diagonal[0]
+    if pivot == 0:
+        raise LinAlgError("Singular matrix")
+    c[0] = upper[0] / pivot if n > 1 else 0
+    d[0] = d[0] / pivot
+    for i in range(1, n):
+        pivot = diagonal[i] - lower[i-1] * c[i-1]
+        if pivot == 0:
+            raise LinAlgError("Singular matrix")
+        c[i] = upper[i] / pivot if i < n - 1 else 0
+        d[i] = (d[i] - lower[i-1] * d[i-1]) / pivot
+
+    # Back substitution
+    for i in range(n - 2, -1, -1):
+        d[i] -= c[i] * d[i+1]
+    return d
+
+def solve_cyclic_tridiagonal(lower, diagonal, upper, bottom_left, top_right, rhs) -> ndarray:
+    """
+    Solve a cyclic tridiagonal system of linear equations in O(n), such as the periodic spline system.
+    The corner entries are handled with the Sherman-Morrison formula on top of two Thomas solves,
+    so the full matrix is never built.
+    Args:
+    lower (ndarray): sub-diagonal, length n-1.
+    diagonal (ndarray): main diagonal, length n.
+    upper (ndarray): super-diagonal, length n-1.
+    bottom_left (float): entry A[n-1, 0].
+    top_right (float): entry A[0, n-1].
+    rhs (ndarray): right hand side, length n, or (n, k) to solve k systems at once.
+    Returns:
+    A solution vector (ndarray).
+    """
+    diagonal = asarray(diagonal, dtype=float64)
+    n = len(diagonal)
+    if n <= 2:
+        # The corners are on the off diagonals of a 2x2 system
+        lower = asarray(lower, dtype=float64) + bottom_left
+        upper = asarray(upper, dtype=float64) + top_right
+        return solve_tridiagonal(lower, diagonal, upper, rhs)
+
+    # A = B + u v^T with u = (gamma, 0, ..., 0, bottom_left) and v = (1, 0, ..., 0, top_right/gamma)
+    gamma = -diagonal[0]
+    modified = diagonal.copy()
+    modified[0] -= gamma
+    modified[-1] -= bottom_left * top_right / gamma
+    x = solve_tridiagonal(lower, modified, upper, rhs)
+
+    u = zeros(n, dtype=float64)
+    u[0] = gamma
+    u[-1] = bottom_left
+    z = solve_tridiagonal(lower, modified, upper, u)
+
+    denominator = 1 + z[0] + top_right * z[-1] / gamma
+    if denominator == 0:
+        raise LinAlgError("Singular matrix")
+    factor = (x[0] + top_right * x[-1] / gamma) / denominator
+    return x - as_column(z, x.ndim) * factor
+
+def banded_normal_equations(first_columns, values, b_vector, n_columns):
+    """
+    Form the normal equations A^TA c = A^Tb of a design matrix whose row i only has the nonzero values values[i]
+    in the consecutive columns first_columns[i], first_columns[i]+1, ..., such as a B-spline basis,
+    in O(n w^2) without building A. A^TA is then banded and stored by diagonals.
+    Args:
+    first_columns (ndarray): column of the first nonzero value of each row.
+    values (ndarray): (n, w) nonzero values of each row.
+    b_vector (ndarray): A vector of constants, or a matrix with one column per right hand side.
+    n_columns (int): number of columns of A.
+    Returns:
+    A^TA as a (w, n_columns) band with band[d, j] = (A^TA)[j, j+d], and A^Tb (ndarray, ndarray).
+    """
+    width = values.shape[1]
+    band = zeros((width, n_columns), dtype=float64)
+    for d in range(width):
+        for p in range(width - d):
+            band[d] += bincount(first_columns + p, values[:, p] * values[:, p + d], minlength=n_columns)[:n_columns]
+
+    b_matrix = asarray(b_vector, dtype=float64).reshape(len(values), -1)
+    b_norm = zeros((n_columns, b_matrix.shape[1]), dtype=float64)
+    for p in range(width):
+        for k in range(b_matrix.shape[1]):
+            b_norm[:, k] += bincount(first_columns + p, values[:, p] * b_matrix[:, k], minlength=n_columns)[:n_columns]
+    return band, b_norm.reshape((n_columns,) + asarray(b_vector).shape[1:])
+
+def cholesky_banded(band) -> ndarray:
+    """
+    Banded Cholesky factorization A = U^TU of a symmetric positive definite banded matrix in O(n p^2)
+    for p off diagonals, such as banded normal equations.
+    Args:
+    band (ndarray): (p+1, n) upper band with band[d, j] = A[j, j+d].
+    Returns:
+    The upper band of U (ndarray), with U[d, j] = U_{j, j+d}.
+    """
+    band = asarray(band, dtype=float64)
+    p = band.shape[0] - 1
+    n = band.shape[1]
+    U = zeros_like(band)
+    for j in range(n):
+        for d in range(min(p, n - 1 - j) + 1):
+            i = j + d
+            value = band[d, j]
+            for k in range(max(0, i - p), j):
+                value -= U[j - k, k] * U[i - k, k]
+            if d == 0:
+                if value <= 0:
+                    raise LinAlgError("Matrix is not positive definite")
+                U[0, j] = sqrt(value)
+            else:
+                U[d, j] = value / U[0, j]
+    return U
+
+def solve_cholesky_banded(U, rhs) -> ndarray:
+    """
+    Solve A x = rhs from the banded Cholesky factor of A, see cholesky_banded.
+    Args:
+    U (ndarray): (p+1, n) upper band of the factor.
+    rhs (ndarray): right hand side, length n, or (n, k) to solve k systems at once.
+    Returns:
+    A solution vector (ndarray).
+    """
+    p = U.shape[0] - 1
+    n = U.shape[1]
+    # U^T z = rhs, then U x = z
+    x = asarray(rhs, dtype=float64).copy()
+    for j in range(n):
+        for k in range(max(0, j - p), j):
+            x[j] -= U[j - k, k] * x[k]
+        x[j] /= U[0, j]
+    for j in range(n - 1, -1, -1):
+        for i in range(j + 1, min(n, j + p + 1)):
+            x[j] -= U[i - j, j] * x[i]
+        x[j] /= U[0, j]
+    return x
+
+def solve_banded_spd(band, rhs) -> ndarray:
+    """
+    Solve a symmetric positive definite banded system with a banded Cholesky factorization U^TU in O(n p^2)
+    for p off diagonals, such as banded normal equations.
+    Args:
+    band (ndarray): (p+1, n) upper band with band[d, j] = A[j, j+d].
+    rhs (ndarray): right hand side, length n, or (n, k) to solve k systems at once.
+    Returns:
+    A solution vector (ndarray).
+    """
+    return solve_cholesky_banded(cholesky_banded(band), rhs)
+
+def banded_inverse(U) -> ndarray:
+    """
+    Entries of A^-1 within the band of A, from the banded Cholesky factor of A, in O(n p^2) without forming A^-1.
+    From U A^-1 = U^-T, which is lower triangular with diagonal 1/U_jj, the band is filled from the last row up:
+    S_ij = (delta_ij / U_ii - sum_k U_ik S_kj) / U_ii for j >= i and k = i+1 ... i+p.
+    E.g. tr(A^-1 M) = sum of S * M over the band for any symmetric M within the band of A.
+    Args:
+    U (ndarray): (p+1, n) upper band of the factor, see cholesky_banded.
+    Returns:
+    The upper band of A^-1 (ndarray), with S[d, j] = (A^-1)_{j, j+d}.
+    """
+    p = U.shape[0] - 1
+    n = U.shape[1]
+    S = zeros_like(U)
+    for i in range(n - 1, -1, -1):
+        last = min(p, n - 1 - i)
+        for d in range(last, -1, -1):
+            j = i + d
+            value = 1 / U[0, i] if d == 0 else 0.0
+            for e in range(1, last + 1):
+                k = i + e
+                value -= U[e, i] * (S[j - k, k] if j >= k else S[k - j, j])
+            S[d, i] = value / U[0, i]
+    return S
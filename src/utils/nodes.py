@@ -0,0 +1,38 @@
+import numpy as np
+
+def chebyshev_points(a, b, n):
+    """
+    Chebyshev points of the second kind x_j = cos(j pi / (n-1)) mapped to [a, b], ends included.
+    Args:
+        a (float): interval start
+        b (float): interval end
+        n (int): number of points
+    Returns:
+        ndarray: the points, from b down to a
+    """
+    if n == 1:
+        return np.array([(a + b) / 2])
+    return (a + b) / 2 + (b - a) / 2 * np.cos(np.pi * np.arange(n) / (n - 1))
+
+def leja_order(nodes):
+    """
+    Order nodes as a Leja sequence: each node maximizes the product of its distances to the previous ones.
+    Every prefix of the sequence is then well spread over the interval, so a Newton interpolation can
+    grow one node at a time and stay well conditioned.
+    Args:
+        nodes (ndarray): distinct nodes
+    Returns:
+        ndarray: indices of the nodes in Leja order
+    """
+    nodes = np.asarray(nodes, dtype=np.float64)
+    order = np.empty(len(nodes), dtype=np.intp)
+    if len(nodes) == 0:
+        return order
+    order[0] = np.argmax(np.abs(nodes - nodes.mean()))
+    # Sum of log distances instead of the product to avoid overflow, -inf once a node is taken
+    with np.errstate(divide='ignore'):
+        log_distance = np.log(np.abs(nodes - nodes[order[0]]))
+        for k in range(1, len(nodes)):
+            order[k] = np.argmax(log_distance)
+            log_distance += np.log(np.abs(nodes - nodes[order[k]]))
+    return order
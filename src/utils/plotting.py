@@ -1,8 +1,110 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import blake2b
+from pathlib import Path
 import numpy as np
-import matplotlib.pyplot as plt
-import sympy as sp
-plt.rc('text', usetex=True) # Use latex to render text in matplotlib
-plt.rc('text.latex', preamble=r'\usepackage{amsmath}')
+from utils.compile_cache import compile_expression
+
+_plt = None # matplotlib.pyplot, imported and configured on first use
+_settings = {
+    'headless': False, # Render to files with the Agg backend instead of opening windows
+    'usetex': None, # Render with LaTeX when mathtext can not, None to use it when a latex binary is installed
+    'cache_dir': os.path.join(os.path.expanduser('~'), '.cache', 'interpolation', 'figures'), # Rendered LaTeX images
+    'verbose': True, # Print the tables and texts while drawing them
+}
+
+def configure(headless=None, usetex=None, cache_dir=None, verbose=None):
+    """
+    Change the rendering settings, before the first figure for the backend.
+    Args:
+        headless (bool, optional): render to files through the Agg backend, plots are then saved instead of shown
+        usetex (bool, optional): allow LaTeX rendering for the text that mathtext can not render
+        cache_dir (str, optional): directory of the rendered LaTeX images, reused by content hash
+        verbose (bool, optional): print the tables and texts while drawing them
+    """
+    for name, value in (('headless', headless), ('usetex', usetex), ('cache_dir', cache_dir), ('verbose', verbose)):
+        if value is not None:
+            _settings[name] = value
+
+def latex_available():
+    """
+    Whether text can be rendered with LaTeX, allowed by the settings and installed.
+    """
+    if _settings['usetex'] is None:
+        _settings['usetex'] = shutil.which('latex') is not None
+    return _settings['usetex']
+
+def pyplot():
+    """
+    Import matplotlib.pyplot on first use, with the Agg backend when headless.
+    Text is rendered with mathtext by default, and with LaTeX only for the text that needs it.
+    Returns:
+        module: matplotlib.pyplot
+    """
+    global _plt
+    if _plt is None:
+        import matplotlib
+        if _settings['headless']:
+            matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        plt.rc('text.latex', preamble=r'\usepackage{amsmath}')
+        _plt = plt
+    return _plt
+
+def needs_latex(text):
+    """
+    Whether mathtext can not render the math of a text, e.g. matrices and tables, so LaTeX is needed.
+    """
+    from matplotlib.mathtext import MathTextParser
+    parser = MathTextParser('path')
+    for math in text.split('$')[1::2]:
+        try:
+            parser.parse(f"${math}$")
+        except ValueError:
+            return True
+    return False
+
+def render_text_image(text, fontsize=12):
+    """
+    Render a text with LaTeX to a PNG image once, cached on disk by content hash, as a LaTeX run takes seconds.
+    Args:
+        text (str): text to render
+        fontsize (int, optional): font size. Defaults to 12.
+    Returns:
+        str: path of the cached image
+    """
+    import matplotlib
+    from matplotlib.figure import Figure
+    key = blake2b(f"{matplotlib.__version__}|{fontsize}|{text}".encode('utf-8'), digest_size=16).hexdigest()
+    path = os.path.join(_settings['cache_dir'], key + '.png')
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(_settings['cache_dir'], exist_ok=True)
+    figure = Figure()
+    figure.text(0, 0, text, fontsize=fontsize, usetex=True)
+    # Write to a temporary file first, so concurrent renderers never read a partial image
+    descriptor, temporary = tempfile.mkstemp(suffix='.png', dir=_settings['cache_dir'])
+    os.close(descriptor)
+    figure.savefig(temporary, dpi=200, bbox_inches='tight', pad_inches=0.05, transparent=True)
+    os.replace(temporary, path)
+    return path
+
+def _draw_text(ax, text, fontsize=12):
+    """
+    Draw a text at the center of an axis with mathtext, or with LaTeX when needed and available.
+    """
+    ax.axis('off')
+    if not needs_latex(text):
+        ax.text(0.5, 0.5, text, fontsize=fontsize, ha='center', va='center', usetex=False)
+    elif latex_available():
+        import matplotlib.image
+        ax.imshow(matplotlib.image.imread(render_text_image(text, fontsize)))
+    else:
+        # Neither renderer can display the math, show the source instead
+        ax.text(0.5, 0.5, text.replace('$', r'\$'), fontsize=fontsize, ha='center', va='center', usetex=False, wrap=True)
 
 def create_fig(n):
     """
@@ -12,7 +114,7 @@ def create_fig(n):
     Returns:
         fig, axes: The created figure and list of subplot axes.
     """
-    fig, axes = plt.subplots(n, 1, figsize=(6, 2 * n))  # n subplots with height scaled by `n`
+    fig, axes = pyplot().subplots(n, 1, figsize=(6, 2 * n))  # n subplots with height scaled by `n`
     fig.subplots_adjust(hspace=0.5)  # Add some space between the subplots
     return fig, axes
 
@@ -31,8 +133,7 @@ def plot_graph(ax, x_points, y_points, function, title):
 
     ax.scatter(x_points, y_points, color='red', label='Data points')
 
-    x = sp.symbols('x')
-    poly_func = sp.lambdify(x, function, 'numpy') # Turn sympy polynomial into a lambda function that takes x and returns f(x)
+    poly_func = compile_expression(function, 'x') # Turn sympy polynomial into a cached function that takes x and returns f(x)
     x_curve = np.linspace(min(x_points), max(x_points), 100) # Create evenly spaced x values to put in f(x)
     y_curve = poly_func(x_curve) # Create an array out of f(x_curve)
 
@@ -65,7 +166,8 @@ def latex_table(data):
 
 def draw_table(ax, arr, header=list()):
     """
-    Draw a table with the given data in a LaTeX form on a given axis.
+    Draw a table with the given data in a LaTeX form on a given axis,
+    or as a matplotlib table with mathtext cells when LaTeX is not available.
     Args:
         ax (matplotlib.axes.Axes): The axis on which to draw the table.
         arr (list of list): table array
@@ -73,22 +175,28 @@ def draw_table(ax, arr, header=list()):
     """
     arr_copy = arr.copy()
     if header:
+        header = list(header)
         if len(header) <= len(arr_copy):
             header.extend([''] * (len(arr_copy[0]) - len(header))) # Extend the remaining header columns to match size
         else:
             print("Header can't be larger than column size of table")
             return
-        
+
         # Add header argument to the array first row
         arr_copy.insert(0, header)
-    
+
     # Get table latex format of the array
     latex_str = latex_table(arr_copy)
 
     ax.axis('off')  # Turn off the axis for the table
-    print(latex_str)
-    # Write the latex table on the axis
-    ax.text(0.5, 0.5, f"${latex_str}$", fontsize=12, ha='center', va='center')
+    if _settings['verbose']:
+        print(latex_str)
+    if latex_available():
+        # Write the latex table on the axis, rendered once per content
+        _draw_text(ax, f"${latex_str}$")
+    else:
+        cells = [[f"${item}$" if str(item) else '' for item in row] for row in arr_copy]
+        ax.table(cellText=cells, loc='center', cellLoc='center')
 
 def write_text(ax, text):
     """
@@ -97,9 +205,68 @@ def write_text(ax, text):
         ax (matplotlib.axes.Axes): The axis on which to write the text.
         text (str): The text to write.
     """
-    print(text)
-    ax.axis('off')  # Turn off axis lines for text
-    ax.text(0.5, 0.5, text, fontsize=12, ha='center', va='center')
+    if _settings['verbose']:
+        print(text)
+    _draw_text(ax, text)
 
-def show():
-    plt.show()
\ No newline at end of file
+def show(path=None):
+    """
+    Show the open figures, or save them when a path is given or when headless, then close them.
+    Args:
+        path (str, optional): image file, numbered as name-1.png, name-2.png, ... for several figures
+    Returns:
+        list: paths of the saved images
+    """
+    plt = pyplot()
+    if path is None and not _settings['headless']:
+        plt.show()
+        return []
+    if path is None:
+        raise ValueError("A path is needed to save the figures when headless")
+
+    path = Path(path)
+    numbers = plt.get_fignums()
+    paths = list()
+    try:
+        for index, number in enumerate(numbers, start=1):
+            target = path if len(numbers) == 1 else path.with_name(f"{path.stem}-{index}{path.suffix}")
+            plt.figure(number).savefig(target, bbox_inches='tight')
+            paths.append(str(target))
+    finally:
+        plt.close('all')
+    return paths
+
+def _render(model, path, settings):
+    """
+    Worker: plot one fitted model to image files.
+    """
+    configure(**settings)
+    try:
+        return model.plot(path=path)
+    finally:
+        pyplot().close('all') # A failed plot must not leave its figures to the next job of the process
+
+def render_many(jobs, max_workers=None, usetex=None, cache_dir=None):
+    """
+    Render the plots of many fitted models to image files in parallel, headless, over a process pool.
+    The LaTeX images are shared between the processes through the disk cache.
+    Args:
+        jobs (sequence): (fitted model, image path) pairs
+        max_workers (int, optional): number of processes. Defaults to the number of CPUs.
+        usetex (bool, optional): allow LaTeX rendering. Defaults to the current setting.
+        cache_dir (str, optional): directory of the rendered LaTeX images. Defaults to the current setting.
+    Returns:
+        list: saved image paths of each job, or the exception raised by a failed job
+    """
+    settings = {'headless': True, 'verbose': False,
+                'usetex': _settings['usetex'] if usetex is None else usetex,
+                'cache_dir': cache_dir or _settings['cache_dir']}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_render, model, path, settings) for model, path in jobs]
+        results = list()
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as error: # One failing report must not abort the others
+                results.append(error)
+    return results